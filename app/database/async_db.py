@@ -0,0 +1,51 @@
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import ASYNC_DATABASE_URL
+from app.database.db import DATABASE_URL, engine_options
+from app.database.pool_metrics import instrumented_pool_class
+
+# Sync driver -> async driver for the same database
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    # Built on first use, so sync-only deployments never need the async drivers
+    global _async_sessionmaker
+
+    if _async_sessionmaker is None:
+        url = ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+        options = engine_options(url)
+        if not url.startswith("sqlite"):
+            # Reported by /metrics/db-pool next to the sync engines' pools
+            options["poolclass"] = instrumented_pool_class("async-primary", AsyncAdaptedQueuePool)
+        engine = create_async_engine(url, **options)
+        _async_sessionmaker = async_sessionmaker(
+            engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+
+    return _async_sessionmaker
+
+
+# Async counterpart of get_db. Always the primary: replica routing
+# (RoutingSession) only applies to sync sessions
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
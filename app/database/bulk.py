@@ -0,0 +1,73 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+# Rows per multi-row INSERT statement
+INSERT_CHUNK = 500
+
+
+def insert_ignore_statement(dialect_name: str, table, rows: list[dict], conflict_columns: list[str]):
+    """Multi-row INSERT that silently skips rows hitting a unique key."""
+    if dialect_name == "mysql":
+        return mysql.insert(table).values(rows).prefix_with("IGNORE")
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).values(rows).on_conflict_do_nothing(
+            index_elements=conflict_columns
+        )
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).values(rows).on_conflict_do_nothing(
+            index_elements=conflict_columns
+        )
+
+    raise RuntimeError(f"Bulk upsert not supported for dialect {dialect_name}")
+
+
+def insert_ignore(db, table, rows: list[dict], conflict_columns: list[str]) -> int:
+    """Insert rows in chunks, skipping duplicates; returns rows actually inserted."""
+    dialect_name = db.get_bind().dialect.name
+    inserted = 0
+
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        result = db.execute(insert_ignore_statement(dialect_name, table, chunk, conflict_columns))
+        inserted += max(result.rowcount, 0)
+
+    return inserted
+
+
+def upsert_increment_statement(dialect_name: str, table, rows: list[dict],
+                               key_columns: list[str], increment_columns: list[str],
+                               touch_columns: list[str] = ()):
+    """
+    Multi-row INSERT that adds to the existing counters when the key already
+    exists. touch_columns are set to now() on update (the upsert skips ORM onupdate).
+    """
+    touched = {col: func.now() for col in touch_columns}
+    if dialect_name == "mysql":
+        stmt = mysql.insert(table).values(rows)
+        return stmt.on_duplicate_key_update({
+            **{col: table.c[col] + stmt.inserted[col] for col in increment_columns}, **touched
+        })
+    if dialect_name in ("postgresql", "sqlite"):
+        dialect = postgresql if dialect_name == "postgresql" else sqlite
+        stmt = dialect.insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={**{col: table.c[col] + stmt.excluded[col] for col in increment_columns}, **touched},
+        )
+
+    raise RuntimeError(f"Bulk upsert not supported for dialect {dialect_name}")
+
+
+def upsert_increment(db, table, rows: list[dict], key_columns: list[str], increment_columns: list[str],
+                     touch_columns: list[str] = ()):
+    """
+    Atomically add each row's increment columns onto the stored row with the
+    same key, inserting it when missing. Concurrent writers never lose updates.
+    """
+    dialect_name = db.get_bind().dialect.name
+
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        db.execute(upsert_increment_statement(
+            dialect_name, table, chunk, key_columns, increment_columns, touch_columns
+        ))
@@ -0,0 +1,102 @@
+"""
+Bring the database schema up to date with app.database.models.
+
+    python -m app.database.migrate            # apply
+    python -m app.database.migrate --dry-run  # print the DDL only
+
+Additive only: creates missing tables, adds missing columns (nullable or
+with a default), missing indexes and unique constraints (as unique
+indexes), and drops the indexes listed in OBSOLETE_INDEXES. Safe to run
+on every deploy.
+
+Unique keys can't be created over duplicate rows. On databases written
+before they existed, run first:
+
+    python -m app.services.gov_data_import dedupe      # market_prices (uq_market_price_day)
+    python -m app.services.inventory_service dedupe    # inventory (uq_inventory_vendor_product)
+
+After migrating, fill the derived data an existing database lacks, in this
+order (each later step reads what the earlier ones wrote); without it the
+id-filtered routes find nothing for legacy rows:
+
+    python -m app.services.dimensions backfill                # market_prices.commodity_id / market_id
+    python -m app.services.price_service rebuild              # price_stats
+    python -m app.services.rollups rebuild                    # price_rollups
+    python -m app.ml.forecast refresh                         # price_stats forecasts (needs numpy)
+    python -m app.services.vendor_stats rebuild               # vendor dashboard snapshot tables
+    python -m app.services.inventory_service refresh-low-stock  # inventory.low_stock_since
+"""
+import logging
+import sys
+
+from sqlalchemy import UniqueConstraint, inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+from app.database.db import Base, engine
+from app.database import models  # noqa: F401  registers every table on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Indexes replaced by newer ones in the models
+OBSOLETE_INDEXES = {
+    "market_prices": ["ix_market_prices_pair_time"],
+}
+
+
+def plan(connection) -> list:
+    """DDL statements needed to reach the models' schema."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            statements.append(CreateTable(table))
+            statements.extend(CreateIndex(index) for index in table.indexes)
+            continue
+
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                statements.append(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                statements.append(CreateIndex(index))
+
+        # Named unique constraints; MySQL reports them as indexes, SQLite only as constraints
+        unique = indexes | {c["name"] for c in inspector.get_unique_constraints(table.name)}
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in unique:
+                columns = ", ".join(c.name for c in constraint.columns)
+                statements.append(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+
+        for name in OBSOLETE_INDEXES.get(table.name, []):
+            if name in indexes:
+                on_table = f" ON {table.name}" if connection.dialect.name == "mysql" else ""
+                statements.append(text(f"DROP INDEX {name}{on_table}"))
+
+    return statements
+
+
+def migrate(dry_run: bool = False) -> list[str]:
+    with engine.begin() as connection:
+        statements = plan(connection)
+        rendered = [str(s.compile(dialect=connection.dialect)).strip() for s in statements]
+        for statement, sql in zip(statements, rendered):
+            logger.info(sql)
+            if not dry_run:
+                connection.execute(statement)
+
+    logger.info(f"✅ {'Planned' if dry_run else 'Applied'} {len(rendered)} schema changes")
+    return rendered
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if sys.argv[1:] in ([], ["--dry-run"]):
+        migrate(dry_run=sys.argv[1:] == ["--dry-run"])
+    else:
+        print("usage: python -m app.database.migrate [--dry-run]")
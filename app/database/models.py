@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime,Float
+from sqlalchemy import Column, Integer, String, DateTime,Float, UniqueConstraint, ForeignKey, Index, Text, Date
 from sqlalchemy.sql import func
 from datetime import datetime
 from .db import Base
@@ -15,6 +15,36 @@ class Vendor(Base):
     language = Column(String(10))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Commodity(Base):
+    __tablename__ = "commodities"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)  # canonical, lowercase
+
+
+class CommodityAlias(Base):
+    __tablename__ = "commodity_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    commodity_id = Column(Integer, ForeignKey("commodities.id"), nullable=False)
+    alias = Column(String(100), unique=True, nullable=False)
+
+
+class Market(Base):
+    __tablename__ = "markets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)  # canonical, lowercase
+
+
+class MarketAlias(Base):
+    __tablename__ = "market_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    market_id = Column(Integer, ForeignKey("markets.id"), nullable=False)
+    alias = Column(String(100), unique=True, nullable=False)
+
+
 class MarketPrice(Base):
     __tablename__ = "market_prices"
 
@@ -23,7 +53,76 @@ class MarketPrice(Base):
     price_per_unit = Column(Float, nullable=False)
     location = Column(String(100), index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
+
+    # Resolved once at write time; all lookups filter on these
+    commodity_id = Column(Integer, ForeignKey("commodities.id"), nullable=True)
+    market_id = Column(Integer, ForeignKey("markets.id"), nullable=True)
+
+    # One mandi price per commodity, market and arrival date; lets the
+    # importer upsert instead of checking every record first
+    __table_args__ = (
+        UniqueConstraint("product_name", "location", "created_at", name="uq_market_price_day"),
+        # Covering index: pair/time lookups read prices without touching the table
+        Index("ix_market_prices_pair_time_price", "commodity_id", "market_id", "created_at", "price_per_unit"),
+        # Newest prices across all pairs (vendor dashboard's market average)
+        Index("ix_market_prices_created_at", "created_at"),
+    )
+
+class PriceStats(Base):
+    __tablename__ = "price_stats"
+
+    # Rolling statistics per commodity/market, refreshed whenever prices are written
+    commodity_id = Column(Integer, ForeignKey("commodities.id"), primary_key=True)
+    market_id = Column(Integer, ForeignKey("markets.id"), primary_key=True)
+
+    latest_price = Column(Float)
+    latest_at = Column(DateTime)
+    recent_prices = Column(Text)  # JSON list of the last N prices, newest first
+
+    last_n_count = Column(Integer, default=0)
+    last_n_mean = Column(Float)
+    last_n_min = Column(Float)
+    last_n_max = Column(Float)
+    last_n_std = Column(Float)
+
+    # Windows end at latest_at, not at "now", so stats stay meaningful between imports
+    d7_count = Column(Integer, default=0)
+    d7_mean = Column(Float)
+    d7_min = Column(Float)
+    d7_max = Column(Float)
+    d7_std = Column(Float)
+
+    d30_count = Column(Integer, default=0)
+    d30_mean = Column(Float)
+    d30_min = Column(Float)
+    d30_max = Column(Float)
+    d30_std = Column(Float)
+
+    # Today's price forecast, written by the worker (python -m app.ml.forecast refresh)
+    forecast_day = Column(Date, nullable=True)
+    forecast_mean = Column(Float)
+    forecast_sigma = Column(Float)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PriceRollup(Base):
+    __tablename__ = "price_rollups"
+
+    # OHLC per commodity/market and day, week (Monday start) or month bucket
+    grain = Column(String(8), primary_key=True)
+    commodity_id = Column(Integer, ForeignKey("commodities.id"), primary_key=True)
+    market_id = Column(Integer, ForeignKey("markets.id"), primary_key=True)
+    bucket_start = Column(Date, primary_key=True)
+
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    mean = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+
+
 class Purchase(Base):
     __tablename__ = "purchases"
 
@@ -39,6 +138,37 @@ class Purchase(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class VendorStats(Base):
+    __tablename__ = "vendor_stats"
+
+    # Running totals kept in step with purchases, so the dashboard never scans history
+    vendor_id = Column(Integer, primary_key=True)
+    total_purchases = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0)
+    total_purchase_price = Column(Float, nullable=False, default=0)  # sum of price_per_unit
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class VendorProductStats(Base):
+    __tablename__ = "vendor_product_stats"
+
+    vendor_id = Column(Integer, primary_key=True)
+    product_name = Column(String(100), primary_key=True)
+    total_quantity = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_vendor_product_stats_top", "vendor_id", "total_quantity"),
+    )
+
+
+class VendorDailyPurchases(Base):
+    __tablename__ = "vendor_daily_purchases"
+
+    vendor_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+
 class Inventory(Base):
     __tablename__ = "inventory"
 
@@ -49,4 +179,64 @@ class Inventory(Base):
 
     minimum_threshold = Column(Float, default=10)  # 🔔 Alert level
 
+    # Set while quantity_available <= minimum_threshold, kept by the purchase write path
+    low_stock_since = Column(DateTime, nullable=True)
+
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # One row per vendor/product: the key inventory upserts increment on
+        Index("uq_inventory_vendor_product", "vendor_id", "product_name", unique=True),
+        # Low-stock alerts: the vendor's rows with low_stock_since set
+        Index("ix_inventory_vendor_low_stock", "vendor_id", "low_stock_since"),
+    )
+
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    # data.gov.in resource being synced
+    resource_id = Column(String(64), primary_key=True)
+    next_offset = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="running")  # running / complete / failed
+
+    # Incremental sync state
+    latest_arrival_date = Column(DateTime, nullable=True)
+    last_page_fingerprint = Column(String(64), nullable=True)
+    last_full_sweep_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DbHeartbeat(Base):
+    __tablename__ = "db_heartbeats"
+
+    # Bumped on the primary, read on the replica to measure replication lag
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(DateTime, nullable=False)
+
+
+class WorkerLock(Base):
+    __tablename__ = "worker_locks"
+
+    # Lease held by one worker process; others take over once it expires
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String(100), nullable=False)
+    worker = Column(String(200), nullable=False)
+    status = Column(String(20), nullable=False, default="running")  # running / success / failed
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_s = Column(Float, nullable=True)
+    rows = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_runs_job_started", "job_name", "started_at"),
+    )
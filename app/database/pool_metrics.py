@@ -0,0 +1,95 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Checkout counters for one engine's pool."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self.pool = None
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.overflow_opened = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_overflow(self):
+        with self._lock:
+            self.overflow_opened += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        return {
+            "role": self.role,
+            "pool_size": pool.size() if pool else None,
+            "in_use": pool.checkedout() if pool else None,
+            "idle": pool.checkedin() if pool else None,
+            "overflow": max(pool.overflow(), 0) if pool else None,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+            "timeouts": self.timeouts,
+            # Connections opened beyond pool_size (max_overflow headroom used)
+            "overflow_opened": self.overflow_opened,
+        }
+
+
+# role -> PoolMetrics
+POOL_METRICS = {}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    metrics: PoolMetrics = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The pool may be recreated (e.g. after a disconnect); follow the live one
+        self.metrics.pool = self
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def _inc_overflow(self) -> bool:
+        opened = super()._inc_overflow()
+        # The counter starts at -pool_size: above zero the new connection is an overflow one
+        if opened and self._overflow > 0:
+            self.metrics.record_overflow()
+        return opened
+
+
+def instrumented_pool_class(role: str, base=QueuePool):
+    """
+    Pool class for one engine. base is QueuePool for sync engines and
+    AsyncAdaptedQueuePool for async ones (their pool is sync underneath).
+    """
+    # A subclass per engine, so a recreated pool keeps reporting to the same metrics
+    metrics = POOL_METRICS.setdefault(role, PoolMetrics(role))
+    return type(f"InstrumentedQueuePool_{role}", (InstrumentedQueuePool, base), {"metrics": metrics})
+
+
+def pool_stats() -> list[dict]:
+    return [metrics.snapshot() for metrics in POOL_METRICS.values()]
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+
+HEARTBEAT_SQL = {
+    "mysql": "INSERT INTO db_heartbeats (id, beat_at) VALUES (1, CURRENT_TIMESTAMP) "
+             "ON DUPLICATE KEY UPDATE beat_at = CURRENT_TIMESTAMP",
+    "postgresql": "INSERT INTO db_heartbeats (id, beat_at) VALUES (1, CURRENT_TIMESTAMP) "
+                  "ON CONFLICT (id) DO UPDATE SET beat_at = CURRENT_TIMESTAMP",
+    "sqlite": "INSERT INTO db_heartbeats (id, beat_at) VALUES (1, CURRENT_TIMESTAMP) "
+              "ON CONFLICT (id) DO UPDATE SET beat_at = CURRENT_TIMESTAMP",
+}
+
+
+def write_heartbeat(primary):
+    """Bump db_heartbeats.beat_at to the primary's clock; run by the worker every DB_HEARTBEAT_INTERVAL."""
+    with primary.begin() as conn:
+        conn.execute(text(HEARTBEAT_SQL[primary.dialect.name]))
+
+
+def _as_datetime(value):
+    if isinstance(value, str):  # SQLite returns text
+        value = datetime.fromisoformat(value)
+    # Both sides come from the primary's clock; compare them as naive times
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+class ReplicaMonitor:
+    """
+    Tracks how far the replica is behind the primary using the heartbeat row
+    the worker keeps bumping (write_heartbeat): the primary's beat_at is
+    compared with the copy the replica has received, so both timestamps come
+    from the primary's clock and checking never writes. Lag above `max_lag`,
+    a heartbeat older than `max_lag` (worker down, lag unknown), or any error
+    talking to either database sends reads back to the primary until the next check.
+    """
+
+    def __init__(self, primary, replica, max_lag: float, check_interval: float):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self.healthy = False
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _primary_beat(self):
+        with self.primary.connect() as conn:
+            row = conn.execute(text("SELECT beat_at, CURRENT_TIMESTAMP FROM db_heartbeats WHERE id = 1")).first()
+        return (_as_datetime(row[0]), _as_datetime(row[1])) if row else (None, None)
+
+    def _replica_beat(self):
+        with self.replica.connect() as conn:
+            return _as_datetime(conn.execute(text("SELECT beat_at FROM db_heartbeats WHERE id = 1")).scalar())
+
+    def check(self):
+        try:
+            primary_beat, primary_now = self._primary_beat()
+            replica_beat = self._replica_beat()
+            if primary_beat is None or (primary_now - primary_beat).total_seconds() > self.max_lag:
+                if self.healthy:
+                    logger.warning("No recent db heartbeat on the primary (is the worker running?), reading from primary")
+                self.lag = None
+            else:
+                self.lag = (primary_beat - replica_beat).total_seconds() if replica_beat else None
+            healthy = self.lag is not None and self.lag <= self.max_lag
+        except Exception as exc:
+            logger.warning("Replica health check failed, reading from primary: %s", exc)
+            self.lag = None
+            healthy = False
+
+        if healthy != self.healthy:
+            logger.info("Replica %s (lag=%s s)", "in use" if healthy else "bypassed", self.lag)
+        self.healthy = healthy
+
+    def use_replica(self) -> bool:
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            # One thread re-checks; the others keep using the last verdict
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._checked_at = now
+                    self.check()
+                finally:
+                    self._lock.release()
+        return self.healthy
+
+    def status(self) -> dict:
+        return {"healthy": self.healthy, "lag_seconds": self.lag, "max_lag_seconds": self.max_lag}
+
+
+class RoutingSession(Session):
+    """
+    Session that picks its engine per session: read-only sessions
+    (info["read_only"]) use the replica while it is fresh enough, everything
+    else, and any write or flush, goes to the primary.
+    """
+
+    primary = None
+    monitor: ReplicaMonitor = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.info.get("read_only") or self.monitor is None:
+            return self.primary
+        if self._flushing or isinstance(clause, UpdateBase):
+            return self.primary
+
+        # Decide once, so one request never mixes primary and replica reads
+        if "bind" not in self.info:
+            self.info["bind"] = self.monitor.replica if self.monitor.use_replica() else self.primary
+        return self.info["bind"]
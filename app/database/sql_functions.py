@@ -0,0 +1,53 @@
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+class date_bucket(FunctionElement):
+    """
+    date_bucket(interval, column): start date of the day, week (Monday) or
+    month containing column, rendered for the connected database.
+    """
+    type = Date()
+    inherit_cache = True
+    name = "date_bucket"
+    # interval changes the rendered SQL, so it must be part of the cache key
+    _traverse_internals = FunctionElement._traverse_internals + [("interval", InternalTraversal.dp_string)]
+
+    def __init__(self, interval: str, column):
+        if interval not in ("day", "week", "month"):
+            raise ValueError(f"Unknown interval {interval}")
+        self.interval = interval
+        super().__init__(column)
+
+
+def _column(element, compiler, **kw):
+    return compiler.process(list(element.clauses)[0], **kw)
+
+
+@compiles(date_bucket, "mysql")
+def _mysql(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    if element.interval == "week":
+        return f"DATE_SUB(DATE({column}), INTERVAL WEEKDAY({column}) DAY)"
+    if element.interval == "month":
+        return f"DATE_SUB(DATE({column}), INTERVAL DAYOFMONTH({column}) - 1 DAY)"
+    return f"DATE({column})"
+
+
+@compiles(date_bucket, "sqlite")
+def _sqlite(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    if element.interval == "week":
+        # Forward to Sunday (or stay), then back to that week's Monday
+        return f"date({column}, 'weekday 0', '-6 days')"
+    if element.interval == "month":
+        return f"date({column}, 'start of month')"
+    return f"date({column})"
+
+
+@compiles(date_bucket, "postgresql")
+def _postgresql(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    return f"CAST(date_trunc('{element.interval}', {column}) AS DATE)"
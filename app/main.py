@@ -1,74 +1,117 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import purchases
-from app.routes import vendors
-from app.routes import inventory
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.services.gov_data_import import import_gov_prices
-from app.routes import trend
-from app.ml.train_price_model import train_model
 
+# Import routers
+from app.routes import auth, products, prices, negotiations, deals
+from app.routes import purchases, vendors, inventory, trend
 
+#DATABASE
+from app.database.db import engine, replica_engine, replica_monitor, SessionLocal
+from app.database.pool_metrics import pool_stats
+from app.services.cache import start_invalidation_listener
+from app.services.jobs import recent_runs
+from app.services.name_resolver import resolver
+from app.services.stock_alerts import start_stock_alert_listener
 
+# Importing this module has no side effects: no DB connections, no scheduler,
+# no ML libraries. Tables are created by `python -m app.database.migrate`,
+# imports and training run in the worker (`python -m app.worker`).
 
+logger = logging.getLogger(__name__)
 
-# Import routers
-from app.routes import auth, products, prices, negotiations, deals
+ops = APIRouter()
 
-#DATABASE
-from app.database.models import Base
-from app.database.db import engine
-
-# Create FastAPI app
-app = FastAPI(
-    title="Mandi AI Vendor Platform",
-    description="Backend for AI-powered price discovery and negotiation",
-    version="1.0.0"
-)
-scheduler = BackgroundScheduler()
-# Run every day at 2:00 AM
-#scheduler.add_job(import_gov_prices, "cron", hour=2, minute=0)
-# 🤖 AI Training Job  ← ADD HERE
-def nightly_training():
-    print("🤖 Starting nightly AI training...")
-    train_model("potato", "azadpur")
-    train_model("onion", "lasalgaon")
-    print("✅ AI training completed.")
-scheduler.add_job(import_gov_prices, "cron", minute=1)
-scheduler.start()
-
-
-# Allow frontend (Android/Web) to connect
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Later replace with your app domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include route files
-app.include_router(auth.router, prefix="/auth", tags=["Auth"])
-app.include_router(products.router, prefix="/products", tags=["Products"])
-app.include_router(prices.router, prefix="/prices", tags=["Prices"])
-app.include_router(negotiations.router, prefix="/negotiations", tags=["Negotiations"])
-app.include_router(deals.router, prefix="/deals", tags=["Deals"])
-app.include_router(purchases.router, prefix="/purchases", tags=["Purchases"])
-app.include_router(vendors.router, prefix="/vendors", tags=["Vendors"])
-app.include_router(inventory.router, prefix="/inventory", tags=["Inventory"])
-app.include_router(trend.router, prefix="/trends", tags=["Price Trends"])
-
-
-
-# 🗄 CREATE DATABASE TABLES HERE
-Base.metadata.create_all(bind=engine)
-
-@app.get("/health")
+
+@ops.get("/health")
 def health_check():
     return {"status": "ok", "message": "Mandi backend running"}
+
+@ops.get("/metrics/db-pool")
+def db_pool_metrics():
+    return pool_stats()
+
+@ops.get("/metrics/db-replica")
+def db_replica_metrics():
+    if replica_monitor is None:
+        return {"configured": False}
+    return {"configured": True, **replica_monitor.status()}
+
+@ops.get("/metrics/jobs")
+def job_history(limit: int = 50):
+    with SessionLocal() as db:
+        return [
+            {
+                "job_name": run.job_name,
+                "worker": run.worker,
+                "status": run.status,
+                "started_at": run.started_at,
+                "duration_s": run.duration_s,
+                "rows": run.rows,
+                "error": run.error,
+            }
+            for run in recent_runs(db, min(limit, 500))
+        ]
+
 # Root test route
-@app.get("/")
+@ops.get("/")
 def root():
     return {"message": "🚀 Mandi Backend is running!"}
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("🚀 Mandi backend starting")
+    # Load the name index off the event loop, so the first async request doesn't block on it
+    try:
+        await run_in_threadpool(resolver.refresh)
+    except Exception:
+        logger.exception("Could not preload the name resolver; it loads on first use")
+    # Price imports run in the worker; drop this process's cached estimates when they land
+    start_invalidation_listener()
+    # Purchases land in every API process; stream their stock alerts from all of them
+    start_stock_alert_listener()
+    yield
+    # Close pooled connections so a restarting worker doesn't leave them to time out
+    engine.dispose()
+    if replica_engine is not None:
+        replica_engine.dispose()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="Mandi AI Vendor Platform",
+        description="Backend for AI-powered price discovery and negotiation",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+
+    # Allow frontend (Android/Web) to connect
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Later replace with your app domain
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Include route files
+    app.include_router(auth.router, prefix="/auth", tags=["Auth"])
+    app.include_router(products.router, prefix="/products", tags=["Products"])
+    app.include_router(prices.router, prefix="/prices", tags=["Prices"])
+    app.include_router(negotiations.router, prefix="/negotiations", tags=["Negotiations"])
+    app.include_router(deals.router, prefix="/deals", tags=["Deals"])
+    app.include_router(purchases.router, prefix="/purchases", tags=["Purchases"])
+    app.include_router(vendors.router, prefix="/vendors", tags=["Vendors"])
+    app.include_router(inventory.router, prefix="/inventory", tags=["Inventory"])
+    app.include_router(trend.router, prefix="/trends", tags=["Price Trends"])
+    app.include_router(ops)
+
+    return app
+
+
+# uvicorn app.main:app (or: uvicorn --factory app.main:create_app)
+app = create_app()
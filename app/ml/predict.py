@@ -1,17 +1,19 @@
-import joblib
-import numpy as np
-import os
+from app.ml.registry import registry
 
-MODEL_DIR = os.path.dirname(__file__)
 
-
-def predict_next_price(product_name: str, location: str, current_length: int):
-    model_path = os.path.join(MODEL_DIR, f"{product_name}_{location}_model.pkl")
-
-    if not os.path.exists(model_path):
+def predict_next_price(commodity: str, market: str):
+    """
+    Next price for a canonical commodity/market pair, with the model's metadata,
+    or None if no model has been trained for it.
+    """
+    entry = registry.get(commodity, market)
+    if entry is None:
         return None
 
-    model = joblib.load(model_path)
-    next_day = np.array([[current_length]])
-
-    return float(model.predict(next_day)[0])
+    model, metadata = entry
+    # The model was fitted on the row index; the next point follows the last row it saw
+    next_day = metadata["rows"]
+    if hasattr(model, "coef_"):
+        # Linear model: skip sklearn's per-call input validation
+        return float(model.intercept_ + model.coef_ @ [next_day]), metadata
+    return float(model.predict([[next_day]])[0]), metadata
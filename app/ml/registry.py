@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from app.config import MODEL_CACHE_SIZE, MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def artifact_stem(commodity: str, market: str) -> str:
+    return f"{commodity}_{market}".replace(" ", "-")
+
+
+def metadata_path(commodity: str, market: str, model_dir: str = MODEL_DIR) -> str:
+    """Metadata sidecar for a pair; names are canonical commodity/market names."""
+    return os.path.join(model_dir, artifact_stem(commodity, market) + "_model.json")
+
+
+def artifact_name(commodity: str, market: str, version: int) -> str:
+    # Versioned, so a new artifact never overwrites one a reader may be loading
+    return f"{artifact_stem(commodity, market)}_model_v{version}.pkl"
+
+
+def write_json_atomic(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """
+    Trained models kept in memory, keyed by (commodity, market, version), with
+    LRU eviction. The metadata sidecar is the source of truth: when the trainer
+    replaces it with a new version, the next lookup loads the new artifact.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, max_models: int = MODEL_CACHE_SIZE):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self._models = OrderedDict()  # (commodity, market, version) -> (model, metadata)
+        self._metadata = {}  # (commodity, market) -> (mtime, metadata)
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _current_metadata(self, commodity: str, market: str):
+        meta_path = metadata_path(commodity, market, self.model_dir)
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        cached = self._metadata.get((commodity, market))
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        self._metadata[(commodity, market)] = (mtime, metadata)
+        return metadata
+
+    def get(self, commodity: str, market: str):
+        """(model, metadata) for the latest version, or None if the pair has no model."""
+        metadata = self._current_metadata(commodity, market)
+        if metadata is None:
+            return None
+
+        key = (commodity, market, metadata["version"])
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry
+
+        import joblib
+
+        model = joblib.load(os.path.join(self.model_dir, metadata["artifact"]))
+        entry = (model, metadata)
+
+        with self._lock:
+            # Older versions of this pair are dead weight once a new one loads
+            for old in [k for k in self._models if k[:2] == key[:2] and k != key]:
+                del self._models[old]
+            self._models[key] = entry
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            self.loads += 1
+
+        logger.info("Loaded price model %s/%s v%s", commodity, market, metadata["version"])
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._metadata.clear()
+
+    def stats(self) -> dict:
+        return {"models": len(self._models), "max_models": self.max_models, "loads": self.loads}
+
+
+registry = ModelRegistry()
@@ -1,22 +1,93 @@
 import numpy as np
 from sklearn.linear_model import LinearRegression
 import joblib
+import json
+import logging
 import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from itertools import groupby, islice
 
+from sqlalchemy import func, select, tuple_
+
+from app.config import MODEL_DIR, TRAIN_WORKERS
 from app.database.db import SessionLocal
-from app.database.models import MarketPrice
+from app.database.models import Commodity, Market, MarketPrice
+from app.ml.registry import artifact_name, artifact_stem, metadata_path, write_json_atomic
+from app.services.jobs import check_lease
+from app.services.name_resolver import resolver
+
+logger = logging.getLogger(__name__)
+
+MIN_TRAINING_ROWS = 5
+MANIFEST = "manifest.json"
+# Rows pulled from the server-side cursor at a time
+STREAM_BATCH = 5000
+# Series submitted to the pool per worker before waiting for results
+IN_FLIGHT_PER_WORKER = 2
+
+
+def save_model(model, commodity: str, market: str, metadata: dict, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Write a new model version: the artifact first, then the metadata sidecar
+    pointing at it (atomic rename), so readers only ever see complete models.
+    """
+    meta_path = metadata_path(commodity, market, model_dir)
+    previous = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = json.load(f)
+
+    version = previous["version"] + 1 if previous else 1
+    artifact = artifact_name(commodity, market, version)
+    tmp_path = os.path.join(model_dir, artifact + ".tmp")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, os.path.join(model_dir, artifact))
+
+    metadata = {
+        **metadata,
+        "commodity": commodity,
+        "market": market,
+        "version": version,
+        "artifact": artifact,
+        "trained_at": datetime.utcnow().isoformat(),
+    }
+    write_json_atomic(meta_path, metadata)
+
+    # Keep the previous artifact for readers still holding the old metadata
+    if previous and previous["version"] > 1:
+        stale = os.path.join(model_dir, artifact_name(commodity, market, previous["version"] - 1))
+        if os.path.exists(stale):
+            os.remove(stale)
 
-MODEL_DIR = os.path.dirname(__file__)
+    return metadata
+
+
+def fit_series(commodity: str, market: str, prices: list[float], last_price_at, model_dir: str = MODEL_DIR) -> dict:
+    """Fit and save one pair's model. Runs in pool workers, so it never touches the DB."""
+    started = time.perf_counter()
+
+    X = np.arange(len(prices)).reshape(-1, 1)
+    y = np.array(prices)
+
+    model = LinearRegression()
+    model.fit(X, y)
+
+    metadata = save_model(model, commodity, market, {
+        "rows": len(prices),
+        "last_price_at": str(last_price_at),
+    }, model_dir)
+    metadata["duration_s"] = round(time.perf_counter() - started, 4)
+    return metadata
 
 
 def train_model(product_name: str, location: str):
     db = SessionLocal()
 
-    prices = db.query(MarketPrice.price_per_unit)\
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
-        )\
+    prices = db.query(MarketPrice.price_per_unit, MarketPrice.created_at)\
+        .filter(*resolver.pair_filter(product_name, location))\
         .order_by(MarketPrice.created_at.asc())\
         .all()
 
@@ -24,17 +95,127 @@ def train_model(product_name: str, location: str):
 
     price_list = [p[0] for p in prices]
 
-    if len(price_list) < 5:
-        print(f"Not enough data to train model for {product_name} at {location}")
+    if len(price_list) < MIN_TRAINING_ROWS:
+        logger.warning(f"Not enough data to train model for {product_name} at {location}")
         return
 
-    X = np.array(range(len(price_list))).reshape(-1, 1)
-    y = np.array(price_list)
+    commodity = resolver.canonical_name("commodity", product_name)
+    market = resolver.canonical_name("market", location)
+    metadata = fit_series(commodity, market, price_list, prices[-1][1])
 
-    model = LinearRegression()
-    model.fit(X, y)
+    logger.info(f"✅ Model v{metadata['version']} trained for {commodity} at {market}")
+
+
+def load_manifest(model_dir: str = MODEL_DIR) -> dict:
+    path = os.path.join(model_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"models": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _pairs_to_train(db, manifest: dict, min_rows: int, force: bool):
+    """[(commodity_id, market_id, commodity, market)] with enough history and new data since the last run."""
+    rows = func.count(MarketPrice.id)
+    last_at = func.max(MarketPrice.created_at)
+    candidates = db.execute(
+        select(MarketPrice.commodity_id, MarketPrice.market_id, Commodity.name, Market.name, rows, last_at)
+        .join(Commodity, Commodity.id == MarketPrice.commodity_id)
+        .join(Market, Market.id == MarketPrice.market_id)
+        .group_by(MarketPrice.commodity_id, MarketPrice.market_id, Commodity.name, Market.name)
+        .having(rows >= min_rows)
+    ).all()
+
+    stale, skipped = [], 0
+    for commodity_id, market_id, commodity, market, count, latest in candidates:
+        known = manifest["models"].get(artifact_stem(commodity, market))
+        if not force and known and known["rows"] == count and known["last_price_at"] == str(latest):
+            skipped += 1
+            continue
+        stale.append((commodity_id, market_id, commodity, market))
+    return stale, skipped
+
+
+def _stream_series(db, pairs: list):
+    """Yield (commodity_id, market_id, prices, last_price_at) from one streamed, pair-ordered query."""
+    stmt = (
+        select(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.price_per_unit, MarketPrice.created_at)
+        .where(tuple_(MarketPrice.commodity_id, MarketPrice.market_id).in_([p[:2] for p in pairs]))
+        .order_by(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at)
+        .execution_options(stream_results=True, yield_per=STREAM_BATCH)
+    )
+    for (commodity_id, market_id), rows in groupby(db.execute(stmt), key=lambda r: (r[0], r[1])):
+        rows = list(rows)
+        yield commodity_id, market_id, [r[2] for r in rows], rows[-1][3]
+
+
+def train_all(min_rows: int = MIN_TRAINING_ROWS, workers: int = TRAIN_WORKERS,
+              force: bool = False, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Train every commodity/market pair with at least `min_rows` prices and new
+    data since its last model, fitting in a process pool. Returns a report.
+    """
+    started = time.perf_counter()
+    manifest = load_manifest(model_dir)
+    report = {"trained": 0, "skipped": 0, "failed": []}
+
+    with SessionLocal() as db:
+        pairs, report["skipped"] = _pairs_to_train(db, manifest, min_rows, force)
+        names = {p[:2]: p[2:] for p in pairs}
+        logger.info(f"🤖 Training {len(pairs)} pairs ({report['skipped']} unchanged, skipped)")
+        if not pairs:
+            return report
+
+        workers = workers or os.cpu_count() or 1
+        series = _stream_series(db, pairs)
+        pending, done = {}, 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Fitting starts while the rest of the series are still streaming
+                # in; only a few series per worker are held in memory at a time
+                for commodity_id, market_id, prices, last_at in islice(
+                    series, workers * IN_FLIGHT_PER_WORKER - len(pending)
+                ):
+                    name = names[(commodity_id, market_id)]
+                    pending[pool.submit(fit_series, *name, prices, last_at, model_dir)] = name
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    check_lease()
+                    commodity, market = pending.pop(future)
+                    done += 1
+                    try:
+                        metadata = future.result()
+                    except Exception as exc:
+                        logger.error(f"❌ Training failed for {commodity}/{market}: {exc}")
+                        report["failed"].append({"commodity": commodity, "market": market, "error": str(exc)})
+                    else:
+                        manifest["models"][artifact_stem(commodity, market)] = metadata
+                        report["trained"] += 1
+                        logger.debug(f"{commodity}/{market} v{metadata['version']} in {metadata['duration_s']}s")
+
+                    if done % 100 == 0 or done == len(pairs):
+                        logger.info(f"🤖 {done}/{len(pairs)} pairs done, {len(report['failed'])} failed")
+
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    write_json_atomic(os.path.join(model_dir, MANIFEST), manifest)
+
+    report["duration_s"] = round(time.perf_counter() - started, 2)
+    report["slowest"] = sorted(
+        ((m["duration_s"], name) for name, m in manifest["models"].items() if "duration_s" in m),
+        reverse=True,
+    )[:5]
+    logger.info(f"✅ Training finished: {report['trained']} trained, {report['skipped']} skipped, "
+                f"{len(report['failed'])} failed in {report['duration_s']}s")
+    return report
 
-    model_path = os.path.join(MODEL_DIR, f"{product_name}_{location}_model.pkl")
-    joblib.dump(model, model_path)
 
-    print(f"✅ Model trained for {product_name} at {location}")
+if __name__ == "__main__":
+    # python -m app.ml.train_price_model all [--force]
+    if sys.argv[1:2] == ["all"]:
+        logging.basicConfig(level=logging.INFO)
+        print(json.dumps(train_all(force="--force" in sys.argv), indent=2, default=str))
+    else:
+        print("usage: python -m app.ml.train_price_model all [--force]")
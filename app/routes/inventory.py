@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database.db import get_db
+from app.database.db import SessionLocal, get_read_db
 from app.database.models import Inventory
+from app.services.inventory_service import stock_event
+from app.services.stock_alerts import RESYNC, broker, polls_for_events
 from app.schemas.inventory import InventoryItem
 from pydantic import BaseModel
 from typing import List
@@ -14,26 +20,119 @@ class LowStockItem(BaseModel):
     minimum_threshold: float
     shortage: float
 
+# Seconds between SSE keep-alive comments, so proxies don't close idle streams
+STREAM_KEEPALIVE = 15
+
+# Without Redis, seconds between checks for alerts raised by other processes
+STREAM_POLL_INTERVAL = 5
+
+
+def low_stock_items(db, vendor_id: int) -> list[dict]:
+    # Index lookup on (vendor_id, low_stock_since): only the vendor's low rows are read
+    items = (
+        db.query(Inventory)
+        .filter(Inventory.vendor_id == vendor_id, Inventory.low_stock_since.isnot(None))
+        .order_by(Inventory.low_stock_since)
+        .all()
+    )
+    return [
+        {
+            "product_name": item.product_name,
+            "quantity_available": item.quantity_available,
+            "minimum_threshold": item.minimum_threshold,
+            "shortage": item.minimum_threshold - item.quantity_available
+        }
+        for item in items
+    ]
+
+
 @router.get("/alerts/{vendor_id}", response_model=List[LowStockItem])
-def low_stock_alerts(vendor_id: int, db: Session = Depends(get_db)):
+def low_stock_alerts(vendor_id: int, db: Session = Depends(get_read_db)):
+    return low_stock_items(db, vendor_id)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _snapshot(vendor_id: int) -> list[dict]:
+    # Primary, not the replica: an event committed after subscribing must not predate the snapshot
+    with SessionLocal() as db:
+        return low_stock_items(db, vendor_id)
+
+
+def _poll(vendor_id: int, low: set[str]) -> list[dict]:
+    """Events for the vendor's items that are no longer in the state `low` (the products seen low) says."""
+    with SessionLocal() as db:
+        rows = (
+            db.query(Inventory)
+            .filter(Inventory.vendor_id == vendor_id, Inventory.low_stock_since.isnot(None))
+            .all()
+        )
+        events = [stock_event(row, True) for row in rows if row.product_name not in low]
+
+        restocked = low - {row.product_name for row in rows}
+        if restocked:
+            rows = (
+                db.query(Inventory)
+                .filter(Inventory.vendor_id == vendor_id, Inventory.product_name.in_(restocked))
+                .all()
+            )
+            events.extend(stock_event(row, False) for row in rows)
+    return events
+
+
+# 🔔 Live low-stock feed (Server-Sent Events): a "snapshot" of the current
+# alerts, then a "low_stock" / "restocked" event whenever an item crosses its threshold
+@router.get("/alerts/{vendor_id}/stream")
+async def low_stock_stream(vendor_id: int, request: Request):
+    async def events():
+        # Subscribe before the snapshot, so nothing committed in between is missed
+        queue = broker.subscribe(vendor_id)
+        try:
+            snapshot = await run_in_threadpool(_snapshot, vendor_id)
+            low = {item["product_name"] for item in snapshot}
+            yield _sse("snapshot", snapshot)
 
-    items = db.query(Inventory).filter(Inventory.vendor_id == vendor_id).all()
+            # Events from other processes come through Redis, or by polling without it
+            poll = polls_for_events()
+            while not await request.is_disconnected():
+                try:
+                    received = await asyncio.wait_for(
+                        queue.get(), STREAM_POLL_INTERVAL if poll else STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    received = None
 
-    alerts = []
+                if received is not None and received is not RESYNC:
+                    changes = [received]
+                elif poll or received is RESYNC:
+                    changes = await run_in_threadpool(_poll, vendor_id, low)
+                else:
+                    changes = []
 
-    for item in items:
-        if item.quantity_available <= item.minimum_threshold:
-            alerts.append({
-                "product_name": item.product_name,
-                "quantity_available": item.quantity_available,
-                "minimum_threshold": item.minimum_threshold,
-                "shortage": item.minimum_threshold - item.quantity_available
-            })
+                sent = False
+                for change in changes:
+                    # A poll may already have reported what the broker delivers next, or the reverse
+                    is_low = change["event"] == "low_stock"
+                    if is_low == (change["product_name"] in low):
+                        continue
+                    (low.add if is_low else low.discard)(change["product_name"])
+                    sent = True
+                    yield _sse(change["event"], change)
+                if not sent:
+                    yield ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(vendor_id, queue)
 
-    return alerts
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/{vendor_id}", response_model=list[InventoryItem])
-def get_inventory(vendor_id: int, db: Session = Depends(get_db)):
+def get_inventory(vendor_id: int, db: Session = Depends(get_read_db)):
     return db.query(Inventory).filter(Inventory.vendor_id == vendor_id).all()
 
 
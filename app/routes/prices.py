@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from app.database.db import get_db
-from app.database.models import MarketPrice
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import USE_ASYNC_DB
+from app.database.db import get_db, get_read_db
+from app.database.async_db import get_async_db
+from app.database.models import Commodity, Market, MarketPrice, PriceRollup, PriceStats
 from app.schemas.market_price import MarketPriceCreate, MarketPriceResponse,PriceEstimateResponse,NegotiationRequest, NegotiationResponse,PriceAlertResponse
 from app.schemas.market_price import PriceTrendResponse, PricePoint
+from app.schemas.market_price import BatchEstimateRequest, BatchEstimateResponse
 from app.ml.predict import predict_next_price
+from app.services.dimensions import attach_dimension_ids, normalize_name
+from app.services.name_resolver import resolver
+from app.services.cache import cache, cached, on_price_change, prices_changed
+from app.services import price_export
+from app.services.rollups import GRAINS as ROLLUP_GRAINS, refresh_rollups, rollup_statement
+from app.services.price_service import get_price_stats, get_price_stats_many, recent_prices, refresh_price_stats
 from app.schemas.market_price import ProfitRequest, ProfitResponse
-from sqlalchemy import func
+from sqlalchemy import func, select
 from fastapi import HTTPException
-import csv
 from fastapi.responses import StreamingResponse
-from io import StringIO
-
-import time
+from datetime import datetime
+import base64
+import math
 
-CACHE = {}
-CACHE_TTL = 300  # seconds (5 minutes)
 router = APIRouter()
 
 #MARKET PRICE
@@ -24,57 +31,62 @@ def create_market_price(
     data: MarketPriceCreate,
     db: Session = Depends(get_db)
 ):
-    new_price = MarketPrice(**data.dict())
+    row = {
+        "product_name": normalize_name(data.product_name),
+        "location": normalize_name(data.location),
+        "price_per_unit": data.price_per_unit,
+        "created_at": data.market_date,
+    }
+    attach_dimension_ids(db, [row])
+
+    new_price = MarketPrice(**row)
     db.add(new_price)
+    db.flush()
+    refresh_price_stats(db, [(row["commodity_id"], row["market_id"])])
+    refresh_rollups(db, [(row["commodity_id"], row["market_id"], row["created_at"])])
     db.commit()
     db.refresh(new_price)
+
+    resolver.add("commodity", row["product_name"], row["commodity_id"])
+    resolver.add("market", row["location"], row["market_id"])
+    prices_changed([(row["commodity_id"], row["market_id"])])
     return new_price
 
 #ESTIMATE
-@router.get("/estimate/{product_name}", response_model=PriceEstimateResponse)
-def estimate_price(product_name: str, location: str, db: Session = Depends(get_db)):
-    cache_key = f"{product_name.lower()}_{location.lower()}"
-
-    # ⚡ Return cached result if valid
-    if cache_key in CACHE:
-        data, timestamp = CACHE[cache_key]
-        if time.time() - timestamp < CACHE_TTL:
-            return data
-    prices = (
-        db.query(MarketPrice.price_per_unit)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
-        )
-        .order_by(MarketPrice.created_at.desc())
-        .limit(20)
-        .all()
-    )
+def _pair_key(commodity_id: int, market_id: int) -> str:
+    return f"{commodity_id}:{market_id}"
+
+
+@on_price_change
+def _drop_cached_estimates(pairs):
+    for pair in pairs:
+        cache.invalidate("estimate", _pair_key(*pair))
+
+
+EMPTY_ESTIMATE = {
+    "average_price_qtl": 0,
+    "average_price_kg": 0,
+    "min_price_qtl": 0,
+    "min_price_kg": 0,
+    "max_price_qtl": 0,
+    "max_price_kg": 0,
+    "suggested_price_kg": 0,
+    "data_points": 0
+}
 
-    if not prices:
-        return {
-            "product_name": product_name,
-            "location": location,
-            "average_price": 0,
-            "min_price": 0,
-            "max_price": 0,
-            "suggested_price": 0,
-            "data_points": 0
-        }
 
-    price_list = [p[0] for p in prices]
+def _estimate_from_stats(stats) -> dict:
+    if not stats or not stats.last_n_count:
+        return dict(EMPTY_ESTIMATE)
 
-    avg_price = sum(price_list) / len(price_list)
-    min_price = min(price_list)
-    max_price = max(price_list)
+    avg_price = stats.last_n_mean
+    min_price = stats.last_n_min
+    max_price = stats.last_n_max
 
     # Simple intelligence: suggest slightly below average for negotiation
     suggested_price = round(avg_price * 0.97, 2)
 
-    result = {
-        "product_name": product_name,
-        "location": location,
-
+    return {
         "average_price_qtl": round(avg_price, 2),
         "average_price_kg": round(avg_price / 100, 2),
 
@@ -86,40 +98,110 @@ def estimate_price(product_name: str, location: str, db: Session = Depends(get_d
 
         "suggested_price_kg": round(suggested_price / 100, 2),
 
-        "data_points": len(price_list)
+        "data_points": stats.last_n_count
     }
 
-    CACHE[cache_key] = (result, time.time())
 
-    return result
+@cached("estimate", key=lambda db, commodity_id, market_id: _pair_key(commodity_id, market_id))
+def _estimate_for_pair(db: Session, commodity_id: int, market_id: int) -> dict:
+    return _estimate_from_stats(get_price_stats(db, commodity_id, market_id))
+
+
+@cached("estimate", key=lambda db, commodity_id, market_id: _pair_key(commodity_id, market_id))
+async def _estimate_for_pair_async(db: AsyncSession, commodity_id: int, market_id: int) -> dict:
+    return _estimate_from_stats(await db.get(PriceStats, (commodity_id, market_id)))
+
+
+# Estimates read the primary, not the replica: they fill the shared "estimate"
+# cache, and a lagging replica read right after prices_changed() would put
+# the old stats back for CACHE_TTL. Hits never touch the database anyway.
+def estimate_price(product_name: str, location: str, db: Session = Depends(get_db)):
+    pair = resolver.resolve_pair(product_name, location)
+    estimate = _estimate_for_pair(db, *pair) if pair else EMPTY_ESTIMATE
+
+    return {
+        "product_name": product_name,
+        "location": location,
+        **estimate
+    }
+
+
+async def estimate_price_async(product_name: str, location: str, db: AsyncSession = Depends(get_async_db)):
+    pair = resolver.resolve_pair(product_name, location)
+    estimate = await _estimate_for_pair_async(db, *pair) if pair else EMPTY_ESTIMATE
+
+    return {
+        "product_name": product_name,
+        "location": location,
+        **estimate
+    }
+
+
+router.add_api_route(
+    "/estimate/{product_name}",
+    estimate_price_async if USE_ASYNC_DB else estimate_price,
+    methods=["GET"],
+    response_model=PriceEstimateResponse,
+)
+
+
+@router.post("/estimate/batch", response_model=BatchEstimateResponse)
+def estimate_prices_batch(data: BatchEstimateRequest, db: Session = Depends(get_db)):
+    pairs = [resolver.resolve_pair(item.product_name, item.location) for item in data.items]
+
+    # Same cache entries as the single estimate; only misses go to the DB, in one query
+    estimates = {}
+    for pair in set(filter(None, pairs)):
+        found, value = cache.get("estimate", _pair_key(*pair))
+        if found:
+            estimates[pair] = value
+
+    missing = {pair for pair in pairs if pair and pair not in estimates}
+    if missing:
+        stats_by_pair = {
+            (s.commodity_id, s.market_id): s
+            for s in get_price_stats_many(db, missing)
+        }
+        for pair in missing:
+            estimates[pair] = _estimate_from_stats(stats_by_pair.get(pair))
+            cache.set("estimate", _pair_key(*pair), estimates[pair])
+
+    results = []
+    for item, pair in zip(data.items, pairs):
+        estimate = estimates[pair] if pair else EMPTY_ESTIMATE
+        results.append({
+            "product_name": item.product_name,
+            "location": item.location,
+            "found": estimate["data_points"] > 0,
+            **estimate
+        })
+
+    return {"results": results}
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    return cache.stats()
 
 
 #NEGOTIATE
 @router.post("/negotiate", response_model=NegotiationResponse)
 def negotiate_price(data: NegotiationRequest, db: Session = Depends(get_db)):
 
-    prices = (
-        db.query(MarketPrice.price_per_unit)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{data.product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{data.location.lower()}%")
-        )
-        .order_by(MarketPrice.created_at.desc())
-        .limit(20)
-        .all()
-    )
+    pair = resolver.resolve_pair(data.product_name, data.location)
+    stats = get_price_stats(db, *pair) if pair else None
 
-    if not prices:
+    if not stats or not stats.last_n_count:
         return {
             "market_average": 0,
             "offered_price": data.offered_price,
             "difference_percent": 0,
             "advice": "Not enough market data to give advice.",
-            "suggested_counter_price": 0
+            "suggested_counter_price": 0,
+            "confidence": 0
         }
 
-    price_list = [p[0] for p in prices]
-    avg_price = sum(price_list) / len(price_list)
+    avg_price = stats.last_n_mean
 
     difference_percent = ((data.offered_price - avg_price) / avg_price) * 100
 
@@ -141,32 +223,95 @@ def negotiate_price(data: NegotiationRequest, db: Session = Depends(get_db)):
         "offered_price": data.offered_price,
         "difference_percent": round(difference_percent, 2),
         "advice": advice,
-        "suggested_counter_price": counter_price
+        "suggested_counter_price": counter_price,
+        "confidence": _negotiation_confidence(stats, data.offered_price, difference_percent)
     }
 
-@router.get("/trend/{product_name}", response_model=PriceTrendResponse)
-def price_trend(
-    product_name: str,
-    location: str,
-    limit: int = 50,
-    offset: int = 0,
-    db: Session = Depends(get_db)
-):
-    # Safety limit to prevent huge queries
-    limit = min(limit, 200)
-
-    records = (
-        db.query(MarketPrice.price_per_unit, MarketPrice.created_at)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
+
+# A stored forecast older than this many days is not used for confidence
+FORECAST_MAX_AGE_DAYS = 2
+
+
+def _negotiation_confidence(stats: PriceStats, offered_price: float, difference_percent: float) -> float:
+    """
+    Probability, under the pair's forecast distribution for today, that the
+    market price really falls in the band the advice was based on. The
+    forecast is precomputed by the worker and stored on price_stats.
+    """
+    today = datetime.utcnow().date()
+    if (
+        stats.forecast_day is None
+        or not stats.forecast_sigma
+        or (today - stats.forecast_day).days > FORECAST_MAX_AGE_DAYS
+    ):
+        return 0.5
+
+    mean, sigma = stats.forecast_mean, stats.forecast_sigma
+    below = lambda price: 0.5 * (1 + math.erf((price - mean) / sigma / math.sqrt(2)))  # P(market < price)
+
+    # difference_percent bands: > 3 high, < -5 low, otherwise fair
+    if difference_percent > 3:
+        probability = below(offered_price / 1.03)
+    elif difference_percent < -5:
+        probability = 1 - below(offered_price / 0.95)
+    else:
+        probability = below(offered_price / 0.95) - below(offered_price / 1.03)
+    return round(probability, 2)
+
+TREND_RESOLUTIONS = ("raw", "lttb", *ROLLUP_GRAINS)
+
+# Largest raw trend page
+TREND_PAGE_MAX = 200
+# Points a downsampled trend may ask for; LTTB needs at least 3
+TREND_POINTS_MAX = 2000
+
+
+def _encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _trend_statement(product_name: str, location: str, limit: int, cursor: str | None):
+    stmt = (
+        select(MarketPrice.price_per_unit, MarketPrice.created_at, MarketPrice.id)
+        .where(*resolver.pair_filter(product_name, location))
+        .order_by(MarketPrice.created_at.asc(), MarketPrice.id.asc())
+        .limit(limit + 1)
+    )
+    # Keyset pagination: seek past the last row of the previous page. Spelled
+    # out rather than as a row comparison, which MySQL may not range-scan
+    if cursor:
+        created_at, row_id = _decode_cursor(cursor)
+        stmt = stmt.where(
+            (MarketPrice.created_at > created_at)
+            | ((MarketPrice.created_at == created_at) & (MarketPrice.id > row_id))
         )
+    return stmt
+
+
+def _series_statement(product_name: str, location: str, start_date, end_date):
+    stmt = (
+        select(MarketPrice.created_at, MarketPrice.price_per_unit)
+        .where(*resolver.pair_filter(product_name, location))
         .order_by(MarketPrice.created_at.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
     )
+    if start_date:
+        stmt = stmt.where(MarketPrice.created_at >= start_date)
+    if end_date:
+        stmt = stmt.where(MarketPrice.created_at <= end_date)
+    return stmt
 
+
+def _trend_response(product_name: str, location: str, records, limit: int) -> dict:
+    has_more = len(records) > limit
+    records = records[:limit]
     points = [
         {"price": r[0], "recorded_at": r[1]}
         for r in records
@@ -175,27 +320,108 @@ def price_trend(
     return {
         "product_name": product_name,
         "location": location,
-        "points": points
+        "points": points,
+        "next_cursor": _encode_cursor(records[-1][1], records[-1][2]) if has_more else None,
     }
 
 
-#PRISE DROP ALART
-@router.get("/alerts/{product_name}", response_model=PriceAlertResponse)
-def price_drop_alert(product_name: str, location: str, db: Session = Depends(get_db)):
+def _lttb_response(product_name: str, location: str, rows, max_points: int) -> dict:
+    from app.services import downsampling
 
-    records = (
-        db.query(MarketPrice.price_per_unit)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
+    times, prices = downsampling.series_arrays(rows)
+
+    return {
+        "product_name": product_name,
+        "location": location,
+        "resolution": "lttb",
+        "points": downsampling.lttb_points(times, prices, max_points),
+    }
 
-        )
-        .order_by(MarketPrice.created_at.desc())
-        .limit(10)
-        .all()
-    )
 
-    if len(records) < 2:
+def _rollup_response(product_name: str, location: str, rollups, resolution: str) -> dict:
+    buckets = [
+        {
+            "bucket_start": datetime.combine(r.bucket_start, datetime.min.time()),
+            "open": r.open, "high": r.high, "low": r.low, "close": r.close,
+            "mean": r.mean, "count": r.count,
+        }
+        for r in rollups
+    ]
+    return {
+        "product_name": product_name,
+        "location": location,
+        "resolution": resolution,
+        "points": [],
+        "buckets": buckets,
+    }
+
+
+def _check_resolution(resolution: str):
+    if resolution not in TREND_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(TREND_RESOLUTIONS)}")
+
+
+def price_trend(
+    product_name: str,
+    location: str,
+    limit: int = Query(50, ge=1, le=TREND_PAGE_MAX),
+    cursor: str | None = None,
+    resolution: str = "raw",
+    max_points: int = Query(500, ge=3, le=TREND_POINTS_MAX),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    db: Session = Depends(get_read_db)
+):
+    _check_resolution(resolution)
+    if resolution == "raw":
+        records = db.execute(_trend_statement(product_name, location, limit, cursor)).all()
+        return _trend_response(product_name, location, records, limit)
+
+    if resolution in ROLLUP_GRAINS:
+        pair = resolver.resolve_pair(product_name, location)
+        rollups = db.execute(rollup_statement(resolution, pair, start_date, end_date)).scalars().all()
+        return _rollup_response(product_name, location, rollups, resolution)
+
+    rows = db.execute(_series_statement(product_name, location, start_date, end_date)).all()
+    return _lttb_response(product_name, location, rows, max_points)
+
+
+async def price_trend_async(
+    product_name: str,
+    location: str,
+    limit: int = Query(50, ge=1, le=TREND_PAGE_MAX),
+    cursor: str | None = None,
+    resolution: str = "raw",
+    max_points: int = Query(500, ge=3, le=TREND_POINTS_MAX),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    _check_resolution(resolution)
+    if resolution == "raw":
+        records = (await db.execute(_trend_statement(product_name, location, limit, cursor))).all()
+        return _trend_response(product_name, location, records, limit)
+
+    if resolution in ROLLUP_GRAINS:
+        pair = resolver.resolve_pair(product_name, location)
+        rollups = (await db.execute(rollup_statement(resolution, pair, start_date, end_date))).scalars().all()
+        return _rollup_response(product_name, location, rollups, resolution)
+
+    rows = (await db.execute(_series_statement(product_name, location, start_date, end_date))).all()
+    return _lttb_response(product_name, location, rows, max_points)
+
+
+router.add_api_route(
+    "/trend/{product_name}",
+    price_trend_async if USE_ASYNC_DB else price_trend,
+    methods=["GET"],
+    response_model=PriceTrendResponse,
+)
+
+
+#PRISE DROP ALART
+def _alert_response(product_name: str, location: str, prices: list[float]) -> dict:
+    if len(prices) < 2:
         return {
             "product_name": product_name,
             "location": location,
@@ -206,7 +432,6 @@ def price_drop_alert(product_name: str, location: str, db: Session = Depends(get
             "message": "Not enough data to determine price trend."
         }
 
-    prices = [r[0] for r in records]
     latest_price = prices[0]
     recent_average = sum(prices[1:]) / (len(prices) - 1)
 
@@ -229,45 +454,52 @@ def price_drop_alert(product_name: str, location: str, db: Session = Depends(get
         "message": message
     }
 
-@router.get("/predict/{product_name}")
-def predict_price(product_name: str, location: str, db: Session = Depends(get_db)):
 
-    prices = (
-        db.query(MarketPrice.price_per_unit)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
-        )
-        .order_by(MarketPrice.created_at.asc())
-        .all()
-    )
+def price_drop_alert(product_name: str, location: str, db: Session = Depends(get_read_db)):
+    pair = resolver.resolve_pair(product_name, location)
+    prices = recent_prices(get_price_stats(db, *pair))[:10] if pair else []
+    return _alert_response(product_name, location, prices)
 
-    if len(prices) < 5:
-        return {"message": "Not enough data for prediction"}
 
-    price_list = [p[0] for p in prices]
+async def price_drop_alert_async(product_name: str, location: str, db: AsyncSession = Depends(get_async_db)):
+    pair = resolver.resolve_pair(product_name, location)
+    prices = recent_prices(await db.get(PriceStats, pair))[:10] if pair else []
+    return _alert_response(product_name, location, prices)
 
-    predicted_price = predict_next_price(len(price_list))
 
-    if predicted_price is None:
+router.add_api_route(
+    "/alerts/{product_name}",
+    price_drop_alert_async if USE_ASYNC_DB else price_drop_alert,
+    methods=["GET"],
+    response_model=PriceAlertResponse,
+)
+
+@router.get("/predict/{product_name}")
+def predict_price(product_name: str, location: str):
+    # Model and its training row count come from the in-memory registry; no DB access
+    commodity = resolver.canonical_name("commodity", product_name)
+    market = resolver.canonical_name("market", location)
+    prediction = predict_next_price(commodity, market)
+
+    if prediction is None:
         return {
             "message": "Prediction model not trained yet. Collecting more data."
         }
 
+    predicted_price, metadata = prediction
     return {
         "product_name": product_name,
         "location": location,
-        "predicted_price": round(predicted_price, 2)
+        "predicted_price": round(predicted_price, 2),
+        "model_version": metadata["version"],
+        "trained_on_rows": metadata["rows"],
     }
 
 @router.post("/profit-estimate", response_model=ProfitResponse)
 def calculate_profit(data: ProfitRequest, db: Session = Depends(get_db)):
     avg_price_qtl = (
         db.query(func.avg(MarketPrice.price_per_unit))
-        .filter(
-            MarketPrice.product_name == data.product_name.lower(),
-            MarketPrice.location == data.location.lower()
-        )
+        .filter(*resolver.pair_filter(data.product_name, data.location))
         .scalar()
     )
 
@@ -304,15 +536,20 @@ def calculate_profit(data: ProfitRequest, db: Session = Depends(get_db)):
 
 # 📊 DATA SUMMARY ENDPOINT
 @router.get("/data-summary")
-def data_summary(db: Session = Depends(get_db)):
+def data_summary(db: Session = Depends(get_read_db)):
+    # Month buckets hold the same counts as the raw rows, in far fewer rows
+    records = func.sum(PriceRollup.count)
     results = (
         db.query(
-            MarketPrice.product_name,
-            MarketPrice.location,
-            func.count(MarketPrice.id).label("records")
+            Commodity.name.label("product_name"),
+            Market.name.label("location"),
+            records.label("records")
         )
-        .group_by(MarketPrice.product_name, MarketPrice.location)
-        .order_by(func.count(MarketPrice.id).desc())
+        .join(Commodity, Commodity.id == PriceRollup.commodity_id)
+        .join(Market, Market.id == PriceRollup.market_id)
+        .filter(PriceRollup.grain == "month")
+        .group_by(Commodity.name, Market.name)
+        .order_by(records.desc())
         .limit(10)
         .all()
     )
@@ -328,7 +565,7 @@ def data_summary(db: Session = Depends(get_db)):
 from datetime import datetime
 
 @router.get("/data-freshness")
-def data_freshness(db: Session = Depends(get_db)):
+def data_freshness(db: Session = Depends(get_read_db)):
     latest = (
         db.query(MarketPrice.created_at)
         .order_by(MarketPrice.created_at.desc())
@@ -346,36 +583,53 @@ def data_freshness(db: Session = Depends(get_db)):
         "data_age_hours": round(age_hours, 2),
         "status": "fresh" if age_hours < 24 else "stale"
     }
-@router.get("/export")
-def export_prices(product_name: str, location: str, db: Session = Depends(get_db)):
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
 
-    records = (
-        db.query(MarketPrice)
-        .filter(
-            MarketPrice.product_name.ilike(f"%{product_name.lower()}%"),
-            MarketPrice.location.ilike(f"%{location.lower()}%")
-        )
-        .order_by(MarketPrice.created_at.asc())
-        .all()
-    )
 
-    if not records:
+@router.get("/export")
+def export_prices(
+    product_name: list[str] = Query(...),
+    location: list[str] | None = Query(None),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    format: str = "csv",
+    gzip: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if format != "csv" and gzip:
+        raise HTTPException(status_code=400, detail="gzip is only supported for csv; parquet/arrow are compressed already")
+    if format != "csv" and not price_export.arrow_available():
+        raise HTTPException(status_code=501, detail="Parquet/Arrow export needs pyarrow installed")
+
+    commodity_ids = {resolver.resolve("commodity", name) for name in product_name} - {None}
+    market_ids = None
+    if location:
+        market_ids = {resolver.resolve("market", name) for name in location} - {None}
+
+    stmt = price_export.export_statement(commodity_ids, market_ids, start_date, end_date)
+    if not commodity_ids or market_ids == set() or db.execute(stmt.limit(1)).first() is None:
         return {"message": "No data found"}
 
-    output = StringIO()
-    writer = csv.writer(output)
-
-    # CSV Header
-    writer.writerow(["Product", "Location", "Price per Quintal", "Date Recorded"])
-
-    # Rows
-    for r in records:
-        writer.writerow([r.product_name, r.location, r.price_per_unit, r.created_at])
+    batches = price_export.iter_batches(stmt)
+    if format == "csv":
+        body = price_export.csv_chunks(batches)
+    else:
+        body = price_export.arrow_chunks(batches, format)
 
-    output.seek(0)
+    media_type, extension = EXPORT_FORMATS[format]
+    if gzip:
+        body = price_export.gzip_chunks(body)
+        media_type, extension = "application/gzip", extension + ".gz"
 
+    filename = "_".join(product_name) if len(product_name) <= 3 else "prices"
     return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={product_name}_prices.csv"}
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}_prices.{extension}"}
     )
@@ -1,27 +1,27 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database.db import get_db
-from app.database.models import Purchase,MarketPrice
+from app.database.db import get_db, get_read_db
+from app.database.models import Purchase
 from app.schemas.purchase import PurchaseCreate, PurchaseResponse,PurchaseAnalysisResponse, PurchaseAnalysisItem,SupplierRankingResponse, SupplierRankItem
+from app.schemas.purchase import PurchaseUploadReport
 from sqlalchemy import func
-from app.database.models import Inventory
+from app.services.inventory_service import record_inventory
+from app.services.name_resolver import resolver
+from app.services.price_service import recent_commodity_averages
+from app.services.purchase_upload import UPLOAD_CHUNK, UPLOAD_FORMATS, PurchaseUpload, iter_lines
+from app.services.vendor_stats import record_purchases
+from datetime import datetime
 
 
 router = APIRouter()
 
-# ➕ Add a new purchase
-@router.post("/", response_model=PurchaseResponse)
-def add_purchase(data: PurchaseCreate, db: Session = Depends(get_db)):
-    new_purchase = Purchase(**data.dict())
-    db.add(new_purchase)
-    db.commit()
-    db.refresh(new_purchase)
-    return new_purchase
-
+# Largest list accepted by POST /purchases/batch
+MAX_BATCH = 1000
 
 # 📜 Get all purchases of a vendor
 @router.get("/vendor/{vendor_id}", response_model=list[PurchaseResponse])
-def get_vendor_purchases(vendor_id: int, db: Session = Depends(get_db)):
+def get_vendor_purchases(vendor_id: int, db: Session = Depends(get_read_db)):
     purchases = (
         db.query(Purchase)
         .filter(Purchase.vendor_id == vendor_id)
@@ -32,27 +32,46 @@ def get_vendor_purchases(vendor_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/analysis/{vendor_id}", response_model=PurchaseAnalysisResponse)
-def purchase_analysis(vendor_id: int, db: Session = Depends(get_db)):
+def purchase_analysis(
+    vendor_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int = 100,
+    offset: int = 0,
+    db: Session = Depends(get_read_db)
+):
+    # Safety limit to keep responses bounded for large vendors
+    limit = min(limit, 500)
+
+    query = db.query(Purchase).filter(Purchase.vendor_id == vendor_id)
+    if start_date:
+        query = query.filter(Purchase.created_at >= start_date)
+    if end_date:
+        query = query.filter(Purchase.created_at <= end_date)
 
-    purchases = db.query(Purchase).filter(Purchase.vendor_id == vendor_id).all()
+    purchases = (
+        query.order_by(Purchase.created_at.desc(), Purchase.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(purchases) > limit
+    purchases = purchases[:limit]
+
+    # One grouped query for the distinct products on this page
+    commodity_ids = {
+        name: resolver.resolve("commodity", name)
+        for name in {p.product_name for p in purchases}
+    }
+    market_averages = recent_commodity_averages(db, set(filter(None, commodity_ids.values())))
 
     results = []
 
     for p in purchases:
-        prices = (
-            db.query(MarketPrice.price_per_unit)
-            .filter(
-                MarketPrice.product_name == p.product_name.lower()
-            )
-            .order_by(MarketPrice.created_at.desc())
-            .limit(20)
-            .all()
-        )
-
-        if not prices:
+        market_avg = market_averages.get(commodity_ids[p.product_name])
+        if not market_avg:
             continue
 
-        market_avg = sum(price[0] for price in prices) / len(prices)
         diff_percent = ((p.price_per_unit - market_avg) / market_avg) * 100
 
         if diff_percent > 10:
@@ -74,11 +93,12 @@ def purchase_analysis(vendor_id: int, db: Session = Depends(get_db)):
 
     return {
         "vendor_id": vendor_id,
-        "analysis": results
+        "analysis": results,
+        "next_offset": offset + limit if has_more else None
     }
 
 @router.get("/suppliers/{vendor_id}", response_model=SupplierRankingResponse)
-def supplier_ranking(vendor_id: int, db: Session = Depends(get_db)):
+def supplier_ranking(vendor_id: int, db: Session = Depends(get_read_db)):
 
     suppliers = (
         db.query(
@@ -117,29 +137,76 @@ def supplier_ranking(vendor_id: int, db: Session = Depends(get_db)):
         "vendor_id": vendor_id,
         "suppliers": sorted(results, key=lambda x: x["avg_price"])
     }
+
+
+# ➕ Add a new purchase
 @router.post("/", response_model=PurchaseResponse)
 def add_purchase(data: PurchaseCreate, db: Session = Depends(get_db)):
 
+    data.product_name = resolver.canonical_name("commodity", data.product_name, exact=True)
     new_purchase = Purchase(**data.dict())
     db.add(new_purchase)
 
-    # 📦 Update Inventory
-    inventory = db.query(Inventory).filter(
-        Inventory.vendor_id == data.vendor_id,
-        Inventory.product_name == data.product_name.lower()
-    ).first()
-
-    if inventory:
-        inventory.quantity_available += data.quantity
-    else:
-        inventory = Inventory(
-            vendor_id=data.vendor_id,
-            product_name=data.product_name.lower(),
-            quantity_available=data.quantity
-        )
-        db.add(inventory)
+    # 📦 Update Inventory (atomic upsert, safe under concurrent purchases)
+    record_inventory(db, [new_purchase])
+    record_purchases(db, [new_purchase])
 
     db.commit()
     db.refresh(new_purchase)
 
     return new_purchase
+
+
+# ➕ Add many purchases in one transaction
+@router.post("/batch", response_model=list[PurchaseResponse])
+def add_purchases_batch(items: list[PurchaseCreate], db: Session = Depends(get_db)):
+    if len(items) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} purchases per batch")
+
+    now = datetime.utcnow()
+    purchases = [
+        Purchase(
+            **{**item.dict(), "product_name": resolver.canonical_name("commodity", item.product_name, exact=True)},
+            created_at=now,
+        )
+        for item in items
+    ]
+    db.add_all(purchases)
+
+    record_inventory(db, purchases)
+    record_purchases(db, purchases)
+
+    # Serialize before commit: ids are known after flush, and commit would expire every row
+    db.flush()
+    response = [PurchaseResponse.model_validate(p) for p in purchases]
+    db.commit()
+
+    return response
+
+
+# 📤 Upload a day of offline purchases as NDJSON or CSV (header row first)
+@router.post("/upload", response_model=PurchaseUploadReport)
+async def upload_purchases(request: Request, format: str | None = None):
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in UPLOAD_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(UPLOAD_FORMATS)}")
+
+    # The body is read as it arrives; each chunk is written from the threadpool
+    upload = PurchaseUpload(fmt)
+    try:
+        chunk = []
+        line_no = 0
+        async for line in iter_lines(request.stream()):
+            line_no += 1
+            chunk.append((line_no, line))
+            if len(chunk) >= UPLOAD_CHUNK:
+                await run_in_threadpool(upload.add_chunk, chunk)
+                chunk = []
+        if chunk:
+            await run_in_threadpool(upload.add_chunk, chunk)
+    except BaseException:
+        await run_in_threadpool(upload.abort)
+        raise
+
+    return await run_in_threadpool(upload.finish)
@@ -1,41 +1,105 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import false, func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 
-from app.database.db import get_db
+from app.config import USE_ASYNC_DB
+from app.database.db import get_read_db
+from app.database.async_db import get_async_db
 from app.database.models import MarketPrice
+from app.database.sql_functions import date_bucket
 from app.schemas.market_price import PriceTrendResponse, PricePoint
+from app.services.name_resolver import resolver
 
 router = APIRouter()
 
-@router.get("/price-trend", response_model=PriceTrendResponse)
-def get_price_trend(
-    product_name: str = Query(...),
-    location: str = Query(...),
-    days: int = Query(30),
-    db: Session = Depends(get_db)
-):
+
+INTERVALS = ("day", "week", "month")
+
+
+def price_trend_statement(pair, days: int, interval: str | None = None):
+    """
+    (recorded_at, price) for one (commodity_id, market_id) pair, oldest first.
+    Only reads columns of ix_market_prices_pair_time_price, so it is served
+    from the index alone; with an interval, prices are averaged per bucket in SQL.
+    """
     start_date = datetime.today().date() - timedelta(days=days)
+    if pair is None:
+        return select(MarketPrice.created_at, MarketPrice.price_per_unit).where(false())
 
-    records = (
-        db.query(MarketPrice)
-        .filter(
-            MarketPrice.product_name == product_name.lower(),
-            MarketPrice.location == location.lower(),
-            MarketPrice.created_at >= start_date
+    conditions = (
+        MarketPrice.commodity_id == pair[0],
+        MarketPrice.market_id == pair[1],
+        MarketPrice.created_at >= start_date,
+    )
+    if interval is None:
+        return (
+            select(MarketPrice.created_at, MarketPrice.price_per_unit)
+            .where(*conditions)
+            .order_by(MarketPrice.created_at.asc())
         )
-        .order_by(MarketPrice.date.asc())
-        .all()
+
+    bucket = date_bucket(interval, MarketPrice.created_at)
+    return (
+        select(bucket.label("bucket"), func.avg(MarketPrice.price_per_unit))
+        .where(*conditions)
+        .group_by(bucket)
+        .order_by(bucket)
     )
 
+
+def _price_trend_response(product_name: str, location: str, records, interval: str | None) -> PriceTrendResponse:
     points = [
-        PricePoint(price=r.price_per_unit, recorded_at=r.date)
-        for r in records
+        PricePoint(
+            price=price,
+            recorded_at=datetime.combine(recorded_at, datetime.min.time()) if interval else recorded_at,
+        )
+        for recorded_at, price in records
     ]
 
-
     return PriceTrendResponse(
         product_name=product_name,
         location=location,
-        points=points
+        points=points,
+        resolution=interval or "raw",
     )
+
+
+def _check_interval(interval: str | None):
+    if interval is not None and interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(INTERVALS)}")
+
+
+def get_price_trend(
+    product_name: str = Query(...),
+    location: str = Query(...),
+    days: int = Query(30),
+    interval: str | None = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    _check_interval(interval)
+    pair = resolver.resolve_pair(product_name, location)
+    records = db.execute(price_trend_statement(pair, days, interval)).all()
+    return _price_trend_response(product_name, location, records, interval)
+
+
+async def get_price_trend_async(
+    product_name: str = Query(...),
+    location: str = Query(...),
+    days: int = Query(30),
+    interval: str | None = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _check_interval(interval)
+    pair = resolver.resolve_pair(product_name, location)
+    records = (await db.execute(price_trend_statement(pair, days, interval))).all()
+    return _price_trend_response(product_name, location, records, interval)
+
+
+router.add_api_route(
+    "/price-trend",
+    get_price_trend_async if USE_ASYNC_DB else get_price_trend,
+    methods=["GET"],
+    response_model=PriceTrendResponse,
+)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List
 
@@ -9,8 +9,11 @@ class MarketPriceCreate(BaseModel):
     market_date: datetime   # 👈 add this
 
 
-class MarketPriceResponse(MarketPriceCreate):
+class MarketPriceResponse(BaseModel):
     id: int
+    product_name: str
+    price_per_unit: float
+    location: str
     created_at: datetime
 
     class Config:
@@ -34,6 +37,23 @@ class PriceEstimateResponse(BaseModel):
     data_points: int
 
 
+class EstimateQuery(BaseModel):
+    product_name: str
+    location: str
+
+
+class BatchEstimateRequest(BaseModel):
+    items: List[EstimateQuery] = Field(..., max_length=200)
+
+
+class BatchEstimateItem(PriceEstimateResponse):
+    found: bool  # False when the pair is unknown or has no prices
+
+
+class BatchEstimateResponse(BaseModel):
+    results: List[BatchEstimateItem]
+
+
 class NegotiationRequest(BaseModel):
     product_name: str
     location: str
@@ -55,10 +75,24 @@ class PricePoint(BaseModel):
     recorded_at: datetime
 
 
+class OhlcBucket(BaseModel):
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    mean: float
+    count: int
+
+
 class PriceTrendResponse(BaseModel):
     product_name: str
     location: str
     points: List[PricePoint]
+    # Set for resolution=day/week/month; points is empty then
+    buckets: List[OhlcBucket] | None = None
+    resolution: str = "raw"
+    next_cursor: str | None = None
 
 class PriceAlertResponse(BaseModel):
     product_name: str
@@ -28,6 +28,7 @@ class PurchaseAnalysisItem(BaseModel):
 class PurchaseAnalysisResponse(BaseModel):
     vendor_id: int
     analysis: List[PurchaseAnalysisItem]
+    next_offset: int | None = None  # set when more purchases match
 
 
 class SupplierRankItem(BaseModel):
@@ -40,3 +41,15 @@ class SupplierRankItem(BaseModel):
 class SupplierRankingResponse(BaseModel):
     vendor_id: int
     suppliers: List[SupplierRankItem]
+
+
+class UploadRowError(BaseModel):
+    line: int
+    errors: List[str]
+
+
+class PurchaseUploadReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[UploadRowError]
+    errors_truncated: bool = False  # more rows failed than are listed
@@ -1,11 +1,5 @@
 from pydantic import BaseModel
 
-class VendorDashboardResponse(BaseModel):
-    vendor_id: int
-    total_purchases: int
-    total_spent: float
-    most_purchased_product: str | None
-    recent_purchases_7_days: int
 class VendorDashboardResponse(BaseModel):
     vendor_id: int
     total_purchases: int
@@ -0,0 +1,308 @@
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.config import CACHE_MAX_ENTRIES, CACHE_TTL, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# Tells this process's own messages on the shared tier apart from other processes'
+PROCESS_ID = uuid.uuid4().hex
+
+
+class LocalCache:
+    """Bounded, thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns (found, value)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """
+    Cache tier shared by all workers. `client` is anything speaking the redis-py
+    get/set/delete API (a real Redis connection, or fakeredis in tests).
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, client, ttl: float, prefix: str = "mandi:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.errors = 0
+
+    def get(self, key: str):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception:
+            # A Redis outage degrades to the local tier, never to an error
+            self.errors += 1
+            return False, None
+
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    def set(self, key: str, value, ttl: float | None = None):
+        try:
+            self.client.set(self.prefix + key, json.dumps(value, default=str), ex=int(ttl or self.ttl))
+        except Exception:
+            self.errors += 1
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception:
+            self.errors += 1
+
+    def publish(self, channel: str, message):
+        try:
+            self.client.publish(self.prefix + channel, json.dumps(message))
+        except Exception:
+            self.errors += 1
+
+    def listen(self, channel: str, handler, on_connect, retry_delay: float = 5.0):
+        """
+        Call handler(message) for every message published on channel, forever
+        (run it in a thread). on_connect() runs on every (re)subscribe, since
+        messages sent while disconnected are lost.
+        """
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.prefix + channel)
+                on_connect()
+                for message in pubsub.listen():
+                    handler(json.loads(message["data"]))
+            except Exception:
+                self.errors += 1
+                logger.warning("Lost the %s channel, resubscribing in %ss", channel, retry_delay)
+                time.sleep(retry_delay)
+
+
+class CacheLayer:
+    """In-process LRU in front of an optional shared tier, with hit/miss counters."""
+
+    def __init__(self, local: LocalCache, shared: SharedCache | None = None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(namespace: str, key) -> str:
+        return f"{namespace}:{key}"
+
+    def get(self, namespace: str, key):
+        """Returns (found, value)."""
+        full_key = self._key(namespace, key)
+
+        found, value = self.local.get(full_key)
+        if not found and self.shared is not None:
+            found, value = self.shared.get(full_key)
+            if found:
+                self.local.set(full_key, value)
+
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found, value
+
+    def set(self, namespace: str, key, value, ttl: float | None = None):
+        full_key = self._key(namespace, key)
+        self.local.set(full_key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(full_key, value, ttl)
+
+    def invalidate(self, namespace: str, key):
+        # This process's local tier and the shared tier; other processes drop their
+        # local copies when the change reaches them (start_invalidation_listener),
+        # or at TTL without Redis
+        full_key = self._key(namespace, key)
+        self.local.delete(full_key)
+        if self.shared is not None:
+            self.shared.delete(full_key)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.local.evictions,
+            "entries": len(self.local),
+            "shared_tier": self.shared is not None,
+            "shared_errors": self.shared.errors if self.shared is not None else 0,
+        }
+
+
+def _build_cache() -> CacheLayer:
+    shared = None
+    if REDIS_URL:
+        try:
+            import redis
+            shared = SharedCache(redis.Redis.from_url(REDIS_URL), CACHE_TTL)
+        except ImportError:
+            logger.warning("REDIS_URL is set but the redis package is not installed; using local cache only")
+
+    return CacheLayer(LocalCache(CACHE_MAX_ENTRIES, CACHE_TTL), shared)
+
+
+cache = _build_cache()
+
+
+def _default_key(signature, args, kwargs) -> str:
+    # Plain parameters only: sessions, requests etc. never make it into the key
+    bound = signature.bind_partial(*args, **kwargs)
+    parts = [
+        f"{name}={value}"
+        for name, value in bound.arguments.items()
+        if isinstance(value, (str, int, float, bool)) or value is None
+    ]
+    return "|".join(parts)
+
+
+def cached(namespace: str, key=None, ttl: float | None = None):
+    """
+    Cache a function's (or route's) result in `namespace`. `key` receives the
+    call's arguments and returns the cache key; by default the plain
+    str/int/float/bool arguments are used.
+    """
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def make_key(args, kwargs):
+            return key(*args, **kwargs) if key else _default_key(signature, args, kwargs)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                found, value = cache.get(namespace, cache_key)
+                if found:
+                    return value
+                value = await fn(*args, **kwargs)
+                cache.set(namespace, cache_key, value, ttl)
+                return value
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache_key = make_key(args, kwargs)
+            found, value = cache.get(namespace, cache_key)
+            if found:
+                return value
+            value = fn(*args, **kwargs)
+            cache.set(namespace, cache_key, value, ttl)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+_price_change_hooks = []
+
+# Published on the shared tier so every process runs its hooks for a change
+PRICE_CHANGES_CHANNEL = "price-changes"
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def on_price_change(fn):
+    """Register fn(pairs) to run after market prices for (commodity_id, market_id) pairs change."""
+    _price_change_hooks.append(fn)
+    return fn
+
+
+def _run_hooks(pairs: set):
+    for hook in _price_change_hooks:
+        try:
+            hook(pairs)
+        except Exception:
+            logger.exception("Price change hook %s failed", hook.__name__)
+
+
+def prices_changed(pairs):
+    pairs = set(pairs)
+    if not pairs:
+        return
+
+    _run_hooks(pairs)
+    if cache.shared is not None:
+        # Imports run in the worker: the API processes must drop their local copies too
+        cache.shared.publish(PRICE_CHANGES_CHANNEL, {"source": PROCESS_ID, "pairs": sorted(pairs)})
+
+
+def _remote_price_change(message: dict):
+    if message.get("source") != PROCESS_ID:
+        _run_hooks({tuple(pair) for pair in message["pairs"]})
+
+
+def start_invalidation_listener():
+    """
+    Run this process's price change hooks for changes made by other processes
+    (API startup). Needs the shared tier; without REDIS_URL each process's
+    local tier can serve stale values for up to CACHE_TTL seconds.
+    """
+    global _listener
+
+    if cache.shared is None:
+        logger.info(f"No shared cache tier: cached prices may be up to {CACHE_TTL}s stale across processes")
+        return
+
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=cache.shared.listen,
+                args=(PRICE_CHANGES_CHANNEL, _remote_price_change, cache.local.clear),
+                name="cache-invalidation",
+                daemon=True,
+            )
+            _listener.start()
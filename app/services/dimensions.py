@@ -0,0 +1,198 @@
+import logging
+import sys
+import threading
+
+from sqlalchemy import or_, tuple_
+
+from app.database.bulk import insert_ignore
+from app.database.db import SessionLocal
+from app.database.models import (
+    Commodity, CommodityAlias, Market, MarketAlias, MarketPrice, PriceRollup, PriceStats
+)
+from app.services.cache import prices_changed
+from app.services.price_service import refresh_price_stats
+from app.services.rollups import refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+# kind -> (dimension model, alias model, alias foreign key, market_prices column)
+DIMENSIONS = {
+    "commodity": (Commodity, CommodityAlias, CommodityAlias.commodity_id, "commodity_id"),
+    "market": (Market, MarketAlias, MarketAlias.market_id, "market_id"),
+}
+
+# Name/alias -> id. Rows are never deleted: one merged into another by add_alias
+# stays behind as a redirect, so an entry cached before the merge (here or in
+# another process) still names a valid row and resolve_ids redirects it.
+_id_cache = {"commodity": {}, "market": {}}
+_cache_lock = threading.Lock()
+
+
+def normalize_name(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def _lookup(db, kind: str, names: set[str]) -> dict:
+    model, alias_model, alias_fk, _ = DIMENSIONS[kind]
+    found = dict(db.query(model.name, model.id).filter(model.name.in_(names)).all())
+    found.update(
+        db.query(alias_model.alias, alias_fk).filter(alias_model.alias.in_(names)).all()
+    )
+    return found
+
+
+def _redirects(db, kind: str, ids) -> dict:
+    """Merged-away id -> the id it was merged into, for those among ids."""
+    model, alias_model, alias_fk, _ = DIMENSIONS[kind]
+    return dict(
+        db.query(model.id, alias_fk)
+        .join(alias_model, alias_model.alias == model.name)
+        .filter(model.id.in_(set(ids)), alias_fk != model.id)
+        .all()
+    )
+
+
+def resolve_ids(db, kind: str, names, create: bool = False) -> dict:
+    """
+    Map names to dimension ids, consulting the process cache first.
+    With create=True unknown names become new canonical entries.
+    """
+    names = {normalize_name(n) for n in names if n}
+    cache = _id_cache[kind]
+
+    with _cache_lock:
+        result = {n: cache[n] for n in names if n in cache}
+
+    # Cached ids may have been merged away since, possibly by another process
+    redirects = _redirects(db, kind, result.values()) if result else {}
+    if redirects:
+        result = {n: redirects.get(entity_id, entity_id) for n, entity_id in result.items()}
+        with _cache_lock:
+            cache.update(result)
+
+    missing = names - result.keys()
+    if missing:
+        found = _lookup(db, kind, missing)
+        if create and missing - found.keys():
+            model = DIMENSIONS[kind][0]
+            insert_ignore(db, model.__table__, [{"name": n} for n in missing - found.keys()], ["name"])
+            found.update(_lookup(db, kind, missing - found.keys()))
+
+        result.update(found)
+        with _cache_lock:
+            cache.update(found)
+
+    return result
+
+
+def attach_dimension_ids(db, rows: list[dict]):
+    """Fill commodity_id/market_id on market_prices rows, creating new dimensions as needed."""
+    commodity_ids = resolve_ids(db, "commodity", {r["product_name"] for r in rows}, create=True)
+    market_ids = resolve_ids(db, "market", {r["location"] for r in rows}, create=True)
+
+    for row in rows:
+        row["commodity_id"] = commodity_ids[normalize_name(row["product_name"])]
+        row["market_id"] = market_ids[normalize_name(row["location"])]
+
+
+def add_alias(db, kind: str, alias: str, canonical: str) -> set:
+    """
+    Register `alias` for the canonical name. If the alias was itself imported
+    as a separate dimension row, its prices are re-pointed and the stats and
+    rollups of the merged pairs recomputed; the row stays as a redirect.
+    Returns the (commodity_id, market_id) pairs whose prices moved, for
+    prices_changed() once the caller has committed.
+    """
+    model, alias_model, alias_fk, column = DIMENSIONS[kind]
+    alias = normalize_name(alias)
+    target_id = resolve_ids(db, kind, [canonical], create=True)[normalize_name(canonical)]
+
+    changed = set()
+    duplicate_id = db.query(model.id).filter(model.name == alias).scalar()
+    if duplicate_id is not None and duplicate_id != target_id:
+        price_column = getattr(MarketPrice, column)
+        moved = (
+            db.query(MarketPrice.commodity_id, MarketPrice.market_id)
+            .filter(price_column == duplicate_id, MarketPrice.commodity_id.isnot(None),
+                    MarketPrice.market_id.isnot(None))
+            .distinct()
+            .all()
+        )
+        merged = [
+            (target_id, market_id) if kind == "commodity" else (commodity_id, target_id)
+            for commodity_id, market_id in moved
+        ]
+        changed.update(moved)
+        changed.update(merged)
+
+        # The old id's stats and rollups describe prices that now belong to the merged pairs
+        for derived in (PriceStats, PriceRollup):
+            db.query(derived).filter(getattr(derived, column) == duplicate_id).delete(synchronize_session=False)
+
+        db.query(MarketPrice).filter(price_column == duplicate_id).update(
+            {column: target_id}, synchronize_session=False
+        )
+        db.query(alias_model).filter(alias_fk == duplicate_id).update(
+            {alias_fk.key: target_id}, synchronize_session=False
+        )
+        db.flush()
+
+        if merged:
+            refresh_price_stats(db, merged)
+            refresh_rollups(db, db.query(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at)
+                            .filter(tuple_(MarketPrice.commodity_id, MarketPrice.market_id).in_(merged))
+                            .all())
+
+    db.add(alias_model(**{alias_fk.key: target_id, "alias": alias}))
+
+    with _cache_lock:
+        cache = _id_cache[kind]
+        if duplicate_id is not None:
+            # Names that resolved to the merged-away row
+            for name in [n for n, entity_id in cache.items() if entity_id == duplicate_id]:
+                cache[name] = target_id
+        cache[alias] = target_id
+
+    return changed
+
+
+def backfill_market_price_ids():
+    """Populate commodity_id/market_id on rows written before the dimension tables existed."""
+    with SessionLocal() as db:
+        pairs = (
+            db.query(MarketPrice.product_name, MarketPrice.location)
+            .filter(or_(MarketPrice.commodity_id.is_(None), MarketPrice.market_id.is_(None)))
+            .distinct()
+            .all()
+        )
+
+        commodity_ids = resolve_ids(db, "commodity", {p[0] for p in pairs}, create=True)
+        market_ids = resolve_ids(db, "market", {p[1] for p in pairs}, create=True)
+
+        for product_name, location in pairs:
+            db.query(MarketPrice).filter(
+                MarketPrice.product_name == product_name,
+                MarketPrice.location == location,
+            ).update({
+                "commodity_id": commodity_ids[normalize_name(product_name)],
+                "market_id": market_ids[normalize_name(location)],
+            }, synchronize_session=False)
+
+        db.commit()
+
+    logger.info(f"✅ Backfilled dimension ids for {len(pairs)} commodity/market pairs")
+
+
+if __name__ == "__main__":
+    # python -m app.services.dimensions backfill
+    # python -m app.services.dimensions alias commodity aloo potato
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+
+    if command == "alias":
+        _, _, kind, alias, canonical = sys.argv
+        with SessionLocal() as db:
+            changed = add_alias(db, kind, alias, canonical)
+            db.commit()
+        prices_changed(changed)
+    else:
+        backfill_market_price_ids()
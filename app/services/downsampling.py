@@ -0,0 +1,95 @@
+import numpy as np
+
+# 1970-01-05 was a Monday; weekly buckets start on Mondays
+_MONDAY = np.datetime64("1970-01-05", "D")
+
+
+def bucket_starts(times: np.ndarray, resolution: str) -> np.ndarray:
+    days = times.astype("datetime64[D]")
+    if resolution == "day":
+        return days
+    if resolution == "week":
+        return _MONDAY + ((days - _MONDAY) // 7) * 7
+    if resolution == "month":
+        return times.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown resolution {resolution}")
+
+
+def ohlc(times: np.ndarray, prices: np.ndarray, resolution: str) -> list[dict]:
+    """
+    Open/high/low/close/mean/count per day, week or month, in one vectorized pass.
+    Input must be sorted by time.
+    """
+    if not len(prices):
+        return []
+
+    keys = bucket_starts(times, resolution)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(prices)]
+    counts = ends - starts
+    sums = np.add.reduceat(prices, starts)
+
+    return [
+        {
+            "bucket_start": start.astype("datetime64[s]").item(),
+            "open": float(o), "high": float(h), "low": float(lo), "close": float(c),
+            "mean": float(s / n), "count": int(n),
+        }
+        for start, o, h, lo, c, s, n in zip(
+            keys[starts],
+            prices[starts],
+            np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts),
+            prices[ends - 1],
+            sums,
+            counts,
+        )
+    ]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indexes of `threshold` points that keep
+    the visual shape of the series. x must be increasing numbers.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n-2 interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        # Twice the triangle area for each candidate; the constant half doesn't matter
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(areas.argmax())
+        selected[i + 1] = previous
+
+    return selected
+
+
+def series_arrays(rows) -> tuple[np.ndarray, np.ndarray]:
+    """(times, prices) arrays from (created_at, price) rows."""
+    times = np.array([r[0] for r in rows], dtype="datetime64[us]")
+    prices = np.array([r[1] for r in rows], dtype=float)
+    return times, prices
+
+
+def lttb_points(times: np.ndarray, prices: np.ndarray, threshold: int) -> list[dict]:
+    seconds = times.astype("datetime64[s]").astype(np.int64).astype(float)
+    keep = lttb(seconds, prices, threshold)
+    return [
+        {"price": float(prices[i]), "recorded_at": times[i].astype("datetime64[s]").item()}
+        for i in keep
+    ]
@@ -1,9 +1,26 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import delete, func, select, tuple_
+from app.database.bulk import INSERT_CHUNK, insert_ignore
 from app.database.db import SessionLocal
-from app.database.models import MarketPrice
+from app.database.models import MarketPrice, ImportCheckpoint
+from app.services.dimensions import attach_dimension_ids, normalize_name
+from app.services.name_resolver import resolver
+from app.services.cache import prices_changed
+from app.services.jobs import check_lease
+from app.services.price_service import refresh_price_stats
+from app.services.rollups import refresh_rollups
 import os
-from datetime import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
+import sys
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,91 +28,400 @@ logger = logging.getLogger(__name__)
 
 API_KEY = os.getenv("DATA_GOV_API_KEY")
 RESOURCE_ID = "9ef84268-d588-465a-a308-a864a43d0070"
-BASE_URL = f"https://api.data.gov.in/resource/{RESOURCE_ID}"
+BASE_URL = os.getenv("DATA_GOV_BASE_URL", f"https://api.data.gov.in/resource/{RESOURCE_ID}")
 
+PAGE_SIZE = 1000
+# Pages fetched ahead of the page currently being written
+FETCH_CONCURRENCY = int(os.getenv("DATA_GOV_FETCH_CONCURRENCY", "4"))
+FETCH_RETRIES = int(os.getenv("DATA_GOV_FETCH_RETRIES", "5"))
+FETCH_TIMEOUT = float(os.getenv("DATA_GOV_FETCH_TIMEOUT", "30"))
+# Hourly syncs are incremental; walk the whole resource at most this often
+FULL_SWEEP_HOURS = float(os.getenv("DATA_GOV_FULL_SWEEP_HOURS", "24"))
 
-def import_gov_prices():
-    limit = 1000
-    offset = 0
-    total_imported = 0
 
-    db = SessionLocal()
+def parse_record(rec: dict):
+    """Validate one API record; returns a market_prices row or None if rejected."""
+    try:
+        price = float(rec.get("modal_price"))
+    except (TypeError, ValueError):
+        return None
+
+    # 🚫 Skip unrealistic prices (₹ per quintal)
+    if price < 50 or price > 100000:
+        return None
+
+    product = normalize_name(rec.get("commodity"))
+    market = normalize_name(rec.get("market"))
+    if not product or not market:
+        return None
 
     try:
-        seen = set()
-        while True:
-            params = {
-                "api-key": API_KEY,
-                "format": "json",
-                "limit": limit,
-                "offset": offset
-            }
-
-            response = requests.get(BASE_URL, params=params)
-            data = response.json()
-            records = data.get("records", [])
-
-            if not records:
-                break
+        arrival_date = datetime.strptime(rec.get("arrival_date") or "", "%d/%m/%Y")
+    except ValueError:
+        return None
+
+    return {
+        "product_name": product,
+        "location": market,
+        "price_per_unit": price,
+        "created_at": arrival_date,  # ✅ store mandi date here
+    }
+
+
+def upsert_market_prices(db, rows: list[dict]) -> int:
+    """Insert already-deduplicated rows in multi-row batches, returns rows inserted."""
+    # Duplicates on uq_market_price_day are skipped by the database itself
+    return insert_ignore(
+        db, MarketPrice.__table__, rows, ["product_name", "location", "created_at"]
+    )
+
+
+def _new_rows(db, rows: list[dict]) -> list[dict]:
+    """Rows whose uq_market_price_day key isn't stored yet (one indexed lookup per chunk)."""
+    key = (MarketPrice.product_name, MarketPrice.location, MarketPrice.created_at)
+    existing = set()
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        existing.update(
+            tuple(found) for found in db.execute(
+                select(*key).where(tuple_(*key).in_(
+                    [(row["product_name"], row["location"], row["created_at"]) for row in chunk]
+                ))
+            )
+        )
+    return [row for row in rows if (row["product_name"], row["location"], row["created_at"]) not in existing]
+
+
+def ingest_page(db, records: list[dict]) -> dict:
+    """Parse, dedupe and upsert one API page. Caller commits."""
+    rows = {}
+    rejected = 0
+    latest = None
+
+    for rec in records:
+        row = parse_record(rec)
+        if row is None:
+            rejected += 1
+            continue
+        # 🔍 Same product, market and mandi date seen earlier in this page
+        key = (row["product_name"], row["location"], row["created_at"])
+        rows.setdefault(key, row)
+        if latest is None or row["created_at"] > latest:
+            latest = row["created_at"]
+
+    rows = list(rows.values())
+    attach_dimension_ids(db, rows)
+    new_rows = _new_rows(db, rows)
+    inserted = upsert_market_prices(db, rows)
+
+    # Only pairs/buckets that gained prices need stats and rollups
+    # recomputed; a sweep over already-imported pages touches none
+    pairs = {(row["commodity_id"], row["market_id"]) for row in new_rows}
+    refresh_price_stats(db, pairs)
+    refresh_rollups(db, [(row["commodity_id"], row["market_id"], row["created_at"]) for row in new_rows])
+
+    return {
+        "fetched": len(records),
+        "inserted": inserted,
+        "skipped": len(records) - rejected - inserted,
+        "rejected": rejected,
+        "latest_arrival_date": latest,
+        "pairs": pairs,
+    }
+
+
+_http_session = None
+_http_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """One pooled session shared by all fetch threads, retrying with backoff."""
+    global _http_session
+
+    with _http_lock:
+        if _http_session is None:
+            retry = Retry(
+                total=FETCH_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(FETCH_CONCURRENCY, 1),
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+
+    return _http_session
+
+
+def fetch_page(offset: int, limit: int = PAGE_SIZE, base_url: str = BASE_URL,
+               extra_params: dict | None = None) -> list[dict]:
+    params = {
+        "api-key": API_KEY,
+        "format": "json",
+        "limit": limit,
+        "offset": offset,
+        **(extra_params or {}),
+    }
+
+    response = get_http_session().get(base_url, params=params, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.json().get("records", [])
+
+
+def page_fingerprint(records: list[dict]) -> str:
+    return hashlib.sha1(json.dumps(records, sort_keys=True).encode()).hexdigest()
+
+
+# Newest records first, as incremental syncs read the resource
+NEWEST_FIRST = {"sort[arrival_date]": "desc"}
+
+
+def fetch_newest_page(base_url: str = BASE_URL) -> list[dict]:
+    return fetch_page(0, PAGE_SIZE, base_url, NEWEST_FIRST)
+
+
+def get_checkpoint(db, resource_id: str = RESOURCE_ID) -> ImportCheckpoint:
+    checkpoint = db.get(ImportCheckpoint, resource_id)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(resource_id=resource_id, next_offset=0, status="complete")
+        db.add(checkpoint)
+    return checkpoint
+
+
+def choose_sync_mode(checkpoint: ImportCheckpoint, now: datetime) -> str:
+    """Full sweep on first run, to finish an interrupted sweep, or when the last one is too old."""
+    if checkpoint.latest_arrival_date is None or checkpoint.last_full_sweep_at is None:
+        return "full"
+    if checkpoint.status != "complete":
+        return "full"
+    if now - checkpoint.last_full_sweep_at >= timedelta(hours=FULL_SWEEP_HOURS):
+        return "full"
+    return "incremental"
+
 
-            for rec in records:
-                try:
-                    price = float(rec.get("modal_price"))
-                except:
-                    continue
-                # 🚫 Skip unrealistic prices (₹ per quintal)
-                if price < 50 or price > 100000:
-                    continue
-                product = rec.get("commodity", "").strip().lower()
-                market = rec.get("market", "").strip().lower()
-                date_str = rec.get("arrival_date")
-                    # 🚫 Skip bad records
-                if not product or not market or price <= 0:
-                    continue
-
-
-                try:
-                    arrival_date = datetime.strptime(date_str, "%d/%m/%Y")
-                except:
-                    arrival_date = datetime.utcnow()
-
-                # 🔍 Avoid duplicates (same product, market, created_at date)
-                key = (product, market, arrival_date)
-                # Skip if we already saw this in current batch
-                if key in seen:
-                    continue
-
-                exists = db.query(MarketPrice.id).filter_by(
-                    product_name=product,
-                    location=market,
-                    created_at=arrival_date
-                ).first()
-
-                if exists:
-                    continue
-                seen.add(key)
-
-
-                mp = MarketPrice(
-                    product_name=product,
-                    price_per_unit=price,
-                    location=market,
-                    created_at=arrival_date  # ✅ store mandi date here
-                )
-                db.add(mp)
-                total_imported += 1
+def iter_pages(base_url: str, concurrency: int, start_offset: int = 0, extra_params: dict | None = None):
+    """
+    Yield (offset, records) in offset order until the API returns an empty page.
 
+    Fetch threads keep up to `concurrency` pages in flight while the consumer
+    parses and writes the current one, so network wait and DB writes overlap.
+    Closing the generator early cancels the pages still queued.
+    """
+    concurrency = max(concurrency, 1)
+    next_fetch = start_offset
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def submit_next():
+            nonlocal next_fetch
+            pending.append((
+                next_fetch,
+                pool.submit(fetch_page, next_fetch, PAGE_SIZE, base_url, extra_params),
+            ))
+            next_fetch += PAGE_SIZE
+
+        for _ in range(concurrency):
+            submit_next()
+
+        try:
+            while pending:
+                offset, future = pending.popleft()
+                records = future.result()
+                if not records:
+                    return
+                submit_next()
+                yield offset, records
+        finally:
+            # Pages fetched past the end of the resource are not needed
+            for _, future in pending:
+                future.cancel()
+
+
+def _add_report(totals: dict, report: dict):
+    for name in ("fetched", "inserted", "skipped", "rejected"):
+        totals[name] += report[name]
+
+    latest = report["latest_arrival_date"]
+    if latest and (totals["latest_arrival_date"] is None or latest > totals["latest_arrival_date"]):
+        totals["latest_arrival_date"] = latest
+
+
+def _log_page(offset: int, report: dict):
+    logger.info(
+        "Page offset=%s: inserted=%s skipped=%s rejected=%s",
+        offset, report["inserted"], report["skipped"], report["rejected"]
+    )
+
+
+def _full_sweep(base_url: str, concurrency: int, start_offset: int, totals: dict):
+    # Taken before walking the pages, so records arriving mid-sweep change the
+    # newest page and the next incremental sync doesn't skip them
+    newest_fingerprint = page_fingerprint(fetch_newest_page(base_url))
+
+    # The checkpoint is committed together with each page, so a crashed
+    # sweep resumes after the last page that was written
+    try:
+        for offset, records in iter_pages(base_url, concurrency, start_offset):
+            check_lease()
+            with SessionLocal() as db:
+                report = ingest_page(db, records)
+                checkpoint = get_checkpoint(db)
+                checkpoint.next_offset = offset + PAGE_SIZE
+                checkpoint.status = "running"
+                db.commit()
+
+            prices_changed(report["pairs"])
+            _add_report(totals, report)
+            _log_page(offset, report)
+    except Exception:
+        with SessionLocal() as db:
+            get_checkpoint(db).status = "failed"
             db.commit()
-            offset += limit
-            logger.info(f"Imported {total_imported} records so far...")
+        raise
+
+    with SessionLocal() as db:
+        checkpoint = get_checkpoint(db)
+        checkpoint.next_offset = 0
+        checkpoint.status = "complete"
+        checkpoint.last_full_sweep_at = datetime.utcnow()
+        checkpoint.last_page_fingerprint = newest_fingerprint
+        if totals["latest_arrival_date"] and (
+            checkpoint.latest_arrival_date is None
+            or totals["latest_arrival_date"] > checkpoint.latest_arrival_date
+        ):
+            checkpoint.latest_arrival_date = totals["latest_arrival_date"]
+        db.commit()
+
+
+def _incremental_sync(base_url: str, concurrency: int, known_latest: datetime,
+                      known_fingerprint: str | None, totals: dict):
+    # Newest records first: stop as soon as a page holds nothing we don't already have.
+    # The first page is fetched alone, so an unchanged resource costs one request
+    first = fetch_newest_page(base_url)
+    first_fingerprint = page_fingerprint(first) if first else None
+    if first_fingerprint is None or first_fingerprint == known_fingerprint:
+        logger.info("Resource unchanged since last sync")
+        return
 
-        
-        logger.info("✅ Government data import completed!")
+    # Prefetching only starts once the first page turns out to be new
+    rest = iter_pages(base_url, concurrency, PAGE_SIZE, NEWEST_FIRST)
+    try:
+        for offset, records in chain([(0, first)], rest):
+            check_lease()
+            with SessionLocal() as db:
+                report = ingest_page(db, records)
+                db.commit()
 
+            prices_changed(report["pairs"])
+            _add_report(totals, report)
+            _log_page(offset, report)
 
+            # Records for the newest known day can still trickle in, so only
+            # stop once a page is entirely older than it
+            page_latest = report["latest_arrival_date"]
+            if report["inserted"] == 0 and (page_latest is None or page_latest < known_latest):
+                break
     finally:
-        db.close()
+        rest.close()
+
+    with SessionLocal() as db:
+        checkpoint = get_checkpoint(db)
+        checkpoint.last_page_fingerprint = first_fingerprint
+        if totals["latest_arrival_date"] and totals["latest_arrival_date"] > known_latest:
+            checkpoint.latest_arrival_date = totals["latest_arrival_date"]
+        db.commit()
+
+
+def import_gov_prices(
+    mode: str = "auto",
+    base_url: str = BASE_URL,
+    concurrency: int = FETCH_CONCURRENCY,
+    resume: bool = True,
+):
+    """
+    Sync the data.gov.in resource into market_prices.
+
+    mode is "full" (walk every page), "incremental" (newest pages only) or
+    "auto", which runs incremental syncs and falls back to a full sweep every
+    DATA_GOV_FULL_SWEEP_HOURS.
+    """
+    with SessionLocal() as db:
+        checkpoint = get_checkpoint(db)
+        if mode == "auto":
+            mode = choose_sync_mode(checkpoint, datetime.utcnow())
+        if mode == "incremental" and checkpoint.latest_arrival_date is None:
+            mode = "full"
+
+        start_offset = checkpoint.next_offset if resume and checkpoint.status != "complete" else 0
+        known_latest = checkpoint.latest_arrival_date
+        known_fingerprint = checkpoint.last_page_fingerprint
+        db.commit()
+
+    totals = {
+        "mode": mode, "fetched": 0, "inserted": 0, "skipped": 0, "rejected": 0,
+        "latest_arrival_date": None,
+    }
+
+    if mode == "full":
+        if start_offset:
+            logger.info(f"Resuming government data import from offset {start_offset}")
+        _full_sweep(base_url, concurrency, start_offset, totals)
+    else:
+        _incremental_sync(base_url, concurrency, known_latest, known_fingerprint, totals)
+
+    # New commodities/markets become resolvable right away
+    resolver.refresh()
+
+    logger.info(f"✅ Government data import completed! {totals}")
+    return totals
+
+
+def merge_duplicate_prices() -> int:
+    """
+    Delete repeated (product_name, location, created_at) rows, keeping the
+    oldest. Run once before `python -m app.database.migrate` creates
+    uq_market_price_day, which the importer's upserts conflict on, then
+    rebuild price_stats and rollups from the cleaned table.
+    """
+    key = (MarketPrice.product_name, MarketPrice.location, MarketPrice.created_at)
+    deleted = 0
+
+    with SessionLocal() as db:
+        duplicates = db.execute(
+            select(*key, func.min(MarketPrice.id))
+            .group_by(*key)
+            .having(func.count(MarketPrice.id) > 1)
+        ).all()
+
+        for start in range(0, len(duplicates), INSERT_CHUNK):
+            chunk = duplicates[start:start + INSERT_CHUNK]
+            result = db.execute(
+                delete(MarketPrice)
+                .where(tuple_(*key).in_([tuple(row[:3]) for row in chunk]))
+                .where(MarketPrice.id.notin_([row[3] for row in chunk]))
+                .execution_options(synchronize_session=False)
+            )
+            deleted += result.rowcount
+
+        db.commit()
+
+    logger.info(f"✅ Removed {deleted} duplicate market prices across {len(duplicates)} keys")
+    return deleted
 
 
 if __name__ == "__main__":
-    import_gov_prices()
+    # python -m app.services.gov_data_import           # import
+    # python -m app.services.gov_data_import dedupe    # before migrate adds uq_market_price_day
+    if sys.argv[1:] == ["dedupe"]:
+        merge_duplicate_prices()
+        print("Now run: python -m app.database.migrate, "
+              "python -m app.services.price_service rebuild, python -m app.services.rollups rebuild")
+    else:
+        import_gov_prices()
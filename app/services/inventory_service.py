@@ -0,0 +1,149 @@
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import case, func, select, tuple_, update
+
+from app.database.bulk import INSERT_CHUNK, upsert_increment
+from app.database.db import SessionLocal
+from app.database.models import Inventory
+from app.services.stock_alerts import publish_after_commit
+
+logger = logging.getLogger(__name__)
+
+
+def record_inventory(db, purchases):
+    """
+    Add purchased quantities (objects or dicts with vendor_id, product_name,
+    quantity) onto the vendors' inventory in the caller's transaction.
+
+    One `qty = qty + :delta` upsert per (vendor, product) on the unique key, so
+    concurrent purchases never lose updates or create duplicate rows.
+    """
+    deltas = {}
+    for p in purchases:
+        get = p.get if isinstance(p, dict) else lambda name: getattr(p, name)
+        key = (get("vendor_id"), get("product_name"))
+        deltas[key] = deltas.get(key, 0.0) + get("quantity")
+
+    # Key order, so two batches touching the same rows lock them in the same order
+    rows = [
+        {"vendor_id": vendor_id, "product_name": product_name, "quantity_available": quantity}
+        for (vendor_id, product_name), quantity in sorted(deltas.items())
+    ]
+    upsert_increment(
+        db, Inventory.__table__, rows, ["vendor_id", "product_name"],
+        ["quantity_available"], touch_columns=["last_updated"]
+    )
+    update_low_stock(db, sorted(deltas))
+
+
+def low_stock_since(now: datetime):
+    """low_stock_since for a row after its quantity changed: kept while low, cleared once restocked."""
+    return case(
+        (Inventory.quantity_available <= Inventory.minimum_threshold,
+         func.coalesce(Inventory.low_stock_since, now)),
+        else_=None,
+    )
+
+
+def stock_event(row, low: bool) -> dict:
+    return {
+        "event": "low_stock" if low else "restocked",
+        "vendor_id": row.vendor_id,
+        "product_name": row.product_name,
+        "quantity_available": row.quantity_available,
+        "minimum_threshold": row.minimum_threshold,
+        "shortage": max(row.minimum_threshold - row.quantity_available, 0),
+    }
+
+
+def update_low_stock(db, keys: list[tuple]):
+    """
+    Re-evaluate the low-stock flag of the given (vendor_id, product_name)
+    items after their quantities changed, and queue an alert for each item
+    that crossed its threshold, published once the transaction commits.
+    """
+    now = datetime.utcnow()
+    events = []
+
+    for start in range(0, len(keys), INSERT_CHUNK):
+        key_match = tuple_(Inventory.vendor_id, Inventory.product_name).in_(keys[start:start + INSERT_CHUNK])
+
+        # The upsert has already locked these rows, so this read can't race another writer
+        rows = db.execute(
+            select(Inventory.vendor_id, Inventory.product_name, Inventory.quantity_available,
+                   Inventory.minimum_threshold, Inventory.low_stock_since)
+            .where(key_match)
+        ).all()
+        events.extend(
+            stock_event(row, low)
+            for row in rows
+            if (low := row.quantity_available <= row.minimum_threshold) != (row.low_stock_since is not None)
+        )
+
+        db.execute(
+            update(Inventory).where(key_match).values(low_stock_since=low_stock_since(now)),
+            execution_options={"synchronize_session": False},
+        )
+
+    publish_after_commit(db, events)
+
+
+def refresh_low_stock() -> int:
+    """Recompute low_stock_since for every row, e.g. after migrate adds the column."""
+    with SessionLocal() as db:
+        result = db.execute(
+            # Keep last_updated: quantities didn't change
+            update(Inventory).values(
+                low_stock_since=low_stock_since(datetime.utcnow()), last_updated=Inventory.last_updated
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+
+    logger.info(f"✅ Refreshed low-stock flags on {result.rowcount} inventory items")
+    return result.rowcount
+
+
+def merge_duplicate_inventory() -> int:
+    """
+    Fold duplicate (vendor_id, product_name) rows into the oldest one, summing
+    quantities. Run once before `python -m app.database.migrate` adds the
+    unique index on databases written before it existed.
+    """
+    with SessionLocal() as db:
+        duplicates = (
+            db.query(Inventory.vendor_id, Inventory.product_name)
+            .group_by(Inventory.vendor_id, Inventory.product_name)
+            .having(func.count(Inventory.id) > 1)
+            .all()
+        )
+
+        for vendor_id, product_name in duplicates:
+            rows = (
+                db.query(Inventory)
+                .filter(Inventory.vendor_id == vendor_id, Inventory.product_name == product_name)
+                .order_by(Inventory.id)
+                .all()
+            )
+            keep = rows[0]
+            keep.quantity_available = sum(r.quantity_available or 0 for r in rows)
+            for row in rows[1:]:
+                db.delete(row)
+
+        db.commit()
+
+    logger.info(f"✅ Merged {len(duplicates)} duplicated inventory items")
+    return len(duplicates)
+
+
+if __name__ == "__main__":
+    # python -m app.services.inventory_service dedupe|refresh-low-stock
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["dedupe"]:
+        merge_duplicate_inventory()
+    elif sys.argv[1:] == ["refresh-low-stock"]:
+        refresh_low_stock()
+    else:
+        print("usage: python -m app.services.inventory_service dedupe|refresh-low-stock")
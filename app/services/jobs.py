@@ -0,0 +1,162 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app.database.db import SessionLocal
+from app.database.models import JobRun, WorkerLock
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Lease of the job running in the current thread, see check_lease()
+_current = threading.local()
+
+
+class LeaseLost(RuntimeError):
+    """The running job's lease was taken over or expired; another worker may start it."""
+
+
+class LeaseLock:
+    """
+    Named lease in the worker_locks table. acquire() takes a free or expired
+    lease, or renews one this process already holds; a holder that stops
+    renewing loses the lease after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, ttl: float, holder: str = WORKER_ID):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+
+    def acquire(self) -> bool:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        with SessionLocal() as db:
+            taken = db.query(WorkerLock).filter(
+                WorkerLock.name == self.name,
+                (WorkerLock.holder == self.holder) | (WorkerLock.expires_at < now),
+            ).update({"holder": self.holder, "expires_at": expires_at}, synchronize_session=False)
+
+            if not taken:
+                if db.get(WorkerLock, self.name) is not None:
+                    return False
+                db.add(WorkerLock(name=self.name, holder=self.holder, expires_at=expires_at))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker created the row first
+                db.rollback()
+                return False
+        return True
+
+    def renew(self) -> bool:
+        """Push the expiry out by ttl; False if this holder no longer has the lease."""
+        with SessionLocal() as db:
+            renewed = db.query(WorkerLock).filter(
+                WorkerLock.name == self.name, WorkerLock.holder == self.holder
+            ).update(
+                {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}, synchronize_session=False
+            )
+            db.commit()
+        return renewed > 0
+
+    def release(self):
+        with SessionLocal() as db:
+            db.query(WorkerLock).filter(
+                WorkerLock.name == self.name, WorkerLock.holder == self.holder
+            ).delete(synchronize_session=False)
+            db.commit()
+
+
+def check_lease():
+    """
+    Raise LeaseLost if the job running in this thread has lost its lease.
+    Long jobs call this between steps (pages, batches) so they stop before
+    another worker's run of the same job overlaps with them.
+    """
+    lost = getattr(_current, "lost", None)
+    if lost is not None and lost.is_set():
+        raise LeaseLost("Job lease lost; stopping so another worker can run the job")
+
+
+def _heartbeat(lock: LeaseLock, done: threading.Event, lost: threading.Event):
+    """Renew the lease every ttl/3 until done; flag lost once it can't be held any more."""
+    renewed_at = time.monotonic()
+    while not done.wait(lock.ttl / 3):
+        try:
+            if lock.renew():
+                renewed_at = time.monotonic()
+                continue
+            logger.error(f"❌ Lease {lock.name} was taken over by another worker")
+        except Exception:
+            # The DB may be back before the lease actually runs out
+            logger.exception(f"Could not renew lease {lock.name}")
+            if time.monotonic() - renewed_at < lock.ttl:
+                continue
+        lost.set()
+        return
+
+
+def run_job(name: str, fn, rows_of=None, lock_ttl: float = 3600):
+    """
+    Run fn() once across all workers, recording a job_runs row with its
+    duration, row count (rows_of(result)) and error. Returns the result, or
+    None if another worker is already running the job.
+
+    The lease is renewed every lock_ttl/3 while fn runs, so a run can take
+    longer than lock_ttl; a run that dies blocks the job for at most lock_ttl
+    seconds. If renewal fails, check_lease() makes fn stop at its next step.
+    """
+    # Holder unique per run, so even two threads of one process can't both run the job
+    lock = LeaseLock(f"job:{name}", lock_ttl, holder=f"{WORKER_ID}:{uuid.uuid4().hex[:8]}")
+    if not lock.acquire():
+        logger.info(f"⏭ {name} is already running elsewhere, skipping")
+        return None
+
+    done, lost = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(lock, done, lost), name=f"lease:{name}", daemon=True)
+    heartbeat.start()
+    _current.lost = lost
+
+    with SessionLocal() as db:
+        run = JobRun(job_name=name, worker=WORKER_ID, status="running", started_at=datetime.utcnow())
+        db.add(run)
+        db.commit()
+        run_id = run.id
+
+    started = time.perf_counter()
+    result, error = None, None
+    try:
+        result = fn()
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception(f"❌ Job {name} failed")
+    finally:
+        done.set()
+        heartbeat.join()
+        _current.lost = None
+        with SessionLocal() as db:
+            run = db.get(JobRun, run_id)
+            run.status = "failed" if error else "success"
+            run.finished_at = datetime.utcnow()
+            run.duration_s = round(time.perf_counter() - started, 3)
+            run.error = error
+            if result is not None and rows_of is not None:
+                run.rows = rows_of(result)
+            db.commit()
+        lock.release()
+
+    return result
+
+
+def recent_runs(db, limit: int = 50) -> list[JobRun]:
+    return db.query(JobRun).order_by(JobRun.started_at.desc()).limit(limit).all()
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import false
+
+from app.database.db import SessionLocal
+from app.database.models import MarketPrice
+from app.services.dimensions import DIMENSIONS, normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Other workers pick up names imported elsewhere within this many seconds
+MAX_INDEX_AGE = 600
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.5
+# Shorter input only matches exactly, never by prefix or similarity ("p" is not potato)
+MIN_GUESS_LENGTH = 3
+
+_BEST = "$best"
+_ENTITY = "$entity"
+_AMBIGUOUS = object()
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Names and aliases of one dimension, resolvable by exact match, prefix
+    (via a trie whose nodes remember their shortest completion and whether
+    every completion is the same entity) or trigram similarity, in that order.
+    Read-only once built: changes build a new index (see with_name).
+    """
+
+    def __init__(self, canonical: dict[int, str], aliases: dict[str, int]):
+        self.canonical = dict(canonical)
+        self.aliases = dict(aliases)
+        self.ids = {}
+        self.trie = {}
+        self.grams = {}
+
+        for entity_id, name in canonical.items():
+            self._add(name, entity_id)
+        for alias, entity_id in aliases.items():
+            self._add(alias, entity_id)
+
+    def with_name(self, name: str, entity_id: int) -> "NameIndex":
+        """Copy of this index that also knows name."""
+        canonical = {entity_id: name, **self.canonical}
+        aliases = dict(self.aliases)
+        if canonical[entity_id] != name:
+            aliases[name] = entity_id
+        return NameIndex(canonical, aliases)
+
+    def _add(self, name: str, entity_id: int):
+        self.ids[name] = entity_id
+
+        node = self.trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+            best = node.get(_BEST)
+            if best is None or len(name) < len(best):
+                node[_BEST] = name
+            if node.setdefault(_ENTITY, entity_id) != entity_id:
+                node[_ENTITY] = _AMBIGUOUS
+
+        for gram in _trigrams(name):
+            self.grams.setdefault(gram, set()).add(name)
+
+    def _prefix(self, key: str):
+        """Shortest name starting with key, if all names starting with it are one entity."""
+        node = self.trie
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                return None
+        return node[_BEST] if node[_ENTITY] is not _AMBIGUOUS else None
+
+    def _fuzzy(self, key: str):
+        grams = _trigrams(key)
+        overlap = {}
+        for gram in grams:
+            for name in self.grams.get(gram, ()):
+                overlap[name] = overlap.get(name, 0) + 1
+
+        best_name, best_score = None, FUZZY_THRESHOLD
+        for name, shared in overlap.items():
+            score = shared / (len(grams) + len(_trigrams(name)) - shared)
+            if score >= best_score:
+                best_name, best_score = name, score
+        return best_name
+
+    def resolve(self, text: str, exact: bool = False):
+        """Entity id for text; exact=True accepts only names and aliases, no guessing."""
+        key = normalize_name(text)
+        if not key:
+            return None
+
+        entity_id = self.ids.get(key)
+        if entity_id is not None or exact or len(key) < MIN_GUESS_LENGTH:
+            return entity_id
+
+        name = self._prefix(key) or self._fuzzy(key)
+        return self.ids[name] if name else None
+
+
+class NameResolver:
+    """Process-wide resolver from client input to commodity/market ids."""
+
+    def __init__(self):
+        self._indexes = {kind: NameIndex({}, {}) for kind in DIMENSIONS}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self, db=None):
+        """Rebuild all indexes from the dimension tables and swap them in."""
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+
+        try:
+            indexes = {}
+            for kind, (model, alias_model, alias_fk, _) in DIMENSIONS.items():
+                aliases = dict(db.query(alias_model.alias, alias_fk).all())
+                # Rows merged into another one by add_alias: their name is an alias now
+                canonical = {
+                    entity_id: name for entity_id, name in db.query(model.id, model.name).all()
+                    if aliases.get(name, entity_id) == entity_id
+                }
+                indexes[kind] = NameIndex(canonical, aliases)
+        finally:
+            if own_session:
+                db.close()
+
+        with self._lock:
+            self._indexes = indexes
+            self._loaded_at = time.monotonic()
+
+        logger.info(
+            "Name resolver loaded %s commodities, %s markets",
+            len(indexes["commodity"].canonical), len(indexes["market"].canonical)
+        )
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Name resolver refresh failed, keeping the current index")
+        finally:
+            self._refreshing = False
+
+    def _index(self, kind: str) -> NameIndex:
+        if self._loaded_at is None:
+            # First use in this process: nothing to serve yet
+            self.refresh()
+        elif time.monotonic() - self._loaded_at > MAX_INDEX_AGE:
+            # Stale: keep serving the current index (no DB I/O on the request
+            # path, which may be an event loop) and reload it in a thread
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._background_refresh, name="name-resolver-refresh", daemon=True).start()
+        return self._indexes[kind]
+
+    def add(self, kind: str, name: str, entity_id: int):
+        """Teach the live index a name written by this process."""
+        self._index(kind)
+        name = normalize_name(name)
+        with self._lock:
+            # Readers keep using the old index until the rebuilt one is swapped in
+            index = self._indexes[kind]
+            if name not in index.ids:
+                self._indexes = {**self._indexes, kind: index.with_name(name, entity_id)}
+
+    def resolve(self, kind: str, text: str):
+        return self._index(kind).resolve(text)
+
+    def canonical_name(self, kind: str, text: str, exact: bool = False) -> str:
+        """
+        Canonical spelling of a known name, else the normalized input. Write
+        paths pass exact=True so only names and aliases are rewritten, never
+        prefix or fuzzy guesses.
+        """
+        index = self._index(kind)
+        entity_id = index.resolve(text, exact=exact)
+        if entity_id is None:
+            return normalize_name(text)
+        return index.canonical.get(entity_id, normalize_name(text))
+
+    def resolve_pair(self, product_name: str, location: str):
+        """(commodity_id, market_id), or None if either name is unknown."""
+        commodity_id = self.resolve("commodity", product_name)
+        market_id = self.resolve("market", location)
+        if commodity_id is None or market_id is None:
+            return None
+        return commodity_id, market_id
+
+    def pair_filter(self, product_name: str, location: str) -> list:
+        """Filter clauses selecting one commodity/market pair; matches nothing if unknown."""
+        pair = self.resolve_pair(product_name, location)
+        if pair is None:
+            return [false()]
+        return [MarketPrice.commodity_id == pair[0], MarketPrice.market_id == pair[1]]
+
+
+resolver = NameResolver()
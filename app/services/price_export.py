@@ -0,0 +1,131 @@
+import csv
+import logging
+import zlib
+from io import StringIO
+
+from sqlalchemy import select
+
+from app.database.db import ReadSessionLocal
+from app.database.models import MarketPrice
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor and encoded per chunk
+EXPORT_BATCH = 2000
+
+CSV_HEADER = ["Product", "Location", "Price per Quintal", "Date Recorded"]
+COLUMNS = ["product_name", "location", "price_per_unit", "created_at"]
+
+
+def export_statement(commodity_ids, market_ids=None, start=None, end=None):
+    """Column-only select for an export; market_ids=None means every market."""
+    stmt = (
+        select(MarketPrice.product_name, MarketPrice.location, MarketPrice.price_per_unit, MarketPrice.created_at)
+        .where(MarketPrice.commodity_id.in_(commodity_ids))
+        .order_by(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at)
+    )
+    if market_ids is not None:
+        stmt = stmt.where(MarketPrice.market_id.in_(market_ids))
+    if start is not None:
+        stmt = stmt.where(MarketPrice.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(MarketPrice.created_at <= end)
+    return stmt
+
+
+def iter_batches(stmt, batch_size: int = EXPORT_BATCH):
+    """
+    Yield lists of rows from a server-side cursor. Owns its session, since the
+    request's session is closed before a streaming response body is sent.
+    """
+    with ReadSessionLocal() as db:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for rows in result.partitions():
+            yield rows
+
+
+def csv_chunks(batches):
+    yield (",".join(CSV_HEADER) + "\r\n").encode()
+
+    for rows in batches:
+        buffer = StringIO()
+        csv.writer(buffer).writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file object handing pyarrow's output back in pieces."""
+
+    def __init__(self):
+        self.pieces = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.pieces = b"".join(self.pieces), []
+        return data
+
+
+def _arrow_batch(pa, schema, rows):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+    )
+
+
+def arrow_chunks(batches, fmt: str = "parquet"):
+    """Parquet (one row group per batch) or Arrow IPC stream. Needs pyarrow."""
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("product_name", pa.string()),
+        ("location", pa.string()),
+        ("price_per_unit", pa.float64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for rows in batches:
+        writer.write_batch(_arrow_batch(pa, schema, rows))
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
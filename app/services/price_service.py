@@ -0,0 +1,238 @@
+import json
+import logging
+import math
+import sys
+from datetime import timedelta
+
+from sqlalchemy import and_, func, or_, tuple_
+
+from app.database.db import SessionLocal
+from app.database.models import MarketPrice, PriceStats
+
+logger = logging.getLogger(__name__)
+
+# Prices kept for "last N" stats and alerts
+RECENT_WINDOW = 20
+# Longest dated stats window (d30). A pair can have several rows per day
+# (aliases fold names together, POSTed prices carry any timestamp), so
+# refreshes select it by date rather than by a row count
+STATS_WINDOW_DAYS = 30
+# Ranked rows are read only from this far before the pair's latest price,
+# so refreshes never rank a pair's whole history
+STATS_LOOKBACK_DAYS = 365
+PAIR_CHUNK = 500
+
+
+def _summary(prices: list[float]) -> dict:
+    if not prices:
+        return {"count": 0, "mean": None, "min": None, "max": None, "std": None}
+
+    mean = sum(prices) / len(prices)
+    variance = sum((p - mean) ** 2 for p in prices) / len(prices)
+    return {
+        "count": len(prices),
+        "mean": mean,
+        "min": min(prices),
+        "max": max(prices),
+        "std": math.sqrt(variance),
+    }
+
+
+def _apply(stats: PriceStats, rows: list):
+    """rows: (created_at, price) newest first."""
+    latest_at = rows[0][0]
+    recent = [price for _, price in rows[:RECENT_WINDOW]]
+
+    stats.latest_price = rows[0][1]
+    stats.latest_at = latest_at
+    stats.recent_prices = json.dumps(recent)
+
+    windows = {
+        "last_n": recent,
+        "d7": [price for at, price in rows if at > latest_at - timedelta(days=7)],
+        "d30": [price for at, price in rows if at > latest_at - timedelta(days=STATS_WINDOW_DAYS)],
+    }
+    for prefix, prices in windows.items():
+        for name, value in _summary(prices).items():
+            setattr(stats, f"{prefix}_{name}", value)
+
+
+def _since_latest(latest: dict, days: int, commodity_id, market_id, created_at):
+    """Rows of each pair in `latest` from `days` before its latest price, as one OR filter."""
+    return or_(*(
+        and_(
+            commodity_id == pair_commodity_id,
+            market_id == pair_market_id,
+            created_at >= latest_at - timedelta(days=days),
+        )
+        for (pair_commodity_id, pair_market_id), latest_at in latest.items()
+    ))
+
+
+def _recent_rows(db, pairs: list) -> dict:
+    """Per pair, (created_at, price) newest first: its last RECENT_WINDOW prices and every price in the d30 window."""
+    # Index-only: latest date per pair, to bound the ranked rows below
+    latest = {
+        (commodity_id, market_id): latest_at
+        for commodity_id, market_id, latest_at in
+        db.query(MarketPrice.commodity_id, MarketPrice.market_id, func.max(MarketPrice.created_at))
+        .filter(tuple_(MarketPrice.commodity_id, MarketPrice.market_id).in_(pairs))
+        .group_by(MarketPrice.commodity_id, MarketPrice.market_id)
+    }
+    if not latest:
+        return {}
+
+    window = _since_latest(
+        latest, STATS_LOOKBACK_DAYS, MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at
+    )
+
+    ranked = (
+        db.query(
+            MarketPrice.commodity_id,
+            MarketPrice.market_id,
+            MarketPrice.created_at,
+            MarketPrice.price_per_unit,
+            func.row_number().over(
+                partition_by=(MarketPrice.commodity_id, MarketPrice.market_id),
+                order_by=MarketPrice.created_at.desc(),
+            ).label("rn"),
+        )
+        .filter(window)
+        .subquery()
+    )
+
+    rows = {}
+    for commodity_id, market_id, created_at, price, _ in (
+        db.query(ranked)
+        .filter(or_(
+            ranked.c.rn <= RECENT_WINDOW,
+            _since_latest(latest, STATS_WINDOW_DAYS, ranked.c.commodity_id, ranked.c.market_id, ranked.c.created_at),
+        ))
+        .order_by(ranked.c.commodity_id, ranked.c.market_id, ranked.c.rn)
+    ):
+        rows.setdefault((commodity_id, market_id), []).append((created_at, price))
+    return rows
+
+
+def refresh_price_stats(db, pairs):
+    """Recompute price_stats for the given (commodity_id, market_id) pairs. Caller commits."""
+    pairs = sorted(pairs)
+
+    for start in range(0, len(pairs), PAIR_CHUNK):
+        chunk = pairs[start:start + PAIR_CHUNK]
+        rows = _recent_rows(db, chunk)
+        existing = {
+            (s.commodity_id, s.market_id): s
+            for s in db.query(PriceStats).filter(
+                tuple_(PriceStats.commodity_id, PriceStats.market_id).in_(chunk)
+            )
+        }
+
+        for pair in chunk:
+            stats = existing.get(pair)
+            if pair not in rows:
+                if stats is not None:
+                    db.delete(stats)
+                continue
+
+            if stats is None:
+                stats = PriceStats(commodity_id=pair[0], market_id=pair[1])
+                db.add(stats)
+            _apply(stats, rows[pair])
+
+
+def get_price_stats(db, commodity_id: int, market_id: int):
+    return db.get(PriceStats, (commodity_id, market_id))
+
+
+def get_price_stats_many(db, pairs) -> list:
+    pairs = list(pairs)
+    results = []
+    for start in range(0, len(pairs), PAIR_CHUNK):
+        chunk = pairs[start:start + PAIR_CHUNK]
+        results.extend(
+            db.query(PriceStats)
+            .filter(tuple_(PriceStats.commodity_id, PriceStats.market_id).in_(chunk))
+            .all()
+        )
+    return results
+
+
+def recent_commodity_averages(db, commodity_ids, window: int = RECENT_WINDOW) -> dict:
+    """
+    Average of each commodity's last `window` prices across all markets, in
+    one query over at most STATS_LOOKBACK_DAYS before its latest price.
+    """
+    if not commodity_ids:
+        return {}
+
+    # Index-only: latest date per commodity, to bound the ranked rows below
+    latest = (
+        db.query(MarketPrice.commodity_id, func.max(MarketPrice.created_at))
+        .filter(MarketPrice.commodity_id.in_(list(commodity_ids)))
+        .group_by(MarketPrice.commodity_id)
+        .all()
+    )
+    if not latest:
+        return {}
+
+    window_filter = or_(*(
+        and_(
+            MarketPrice.commodity_id == commodity_id,
+            MarketPrice.created_at >= latest_at - timedelta(days=STATS_LOOKBACK_DAYS),
+        )
+        for commodity_id, latest_at in latest
+    ))
+
+    ranked = (
+        db.query(
+            MarketPrice.commodity_id,
+            MarketPrice.price_per_unit,
+            func.row_number().over(
+                partition_by=MarketPrice.commodity_id,
+                order_by=MarketPrice.created_at.desc(),
+            ).label("rn"),
+        )
+        .filter(window_filter)
+        .subquery()
+    )
+
+    return dict(
+        db.query(ranked.c.commodity_id, func.avg(ranked.c.price_per_unit))
+        .filter(ranked.c.rn <= window)
+        .group_by(ranked.c.commodity_id)
+        .all()
+    )
+
+
+def recent_prices(stats: PriceStats) -> list[float]:
+    """Last RECENT_WINDOW prices, newest first."""
+    return json.loads(stats.recent_prices) if stats and stats.recent_prices else []
+
+
+def rebuild_price_stats():
+    """Recompute price_stats from scratch for every commodity/market pair."""
+    with SessionLocal() as db:
+        pairs = [
+            tuple(p) for p in
+            db.query(MarketPrice.commodity_id, MarketPrice.market_id)
+            .filter(MarketPrice.commodity_id.isnot(None), MarketPrice.market_id.isnot(None))
+            .distinct()
+            .all()
+        ]
+
+        db.query(PriceStats).delete(synchronize_session=False)
+        for start in range(0, len(pairs), PAIR_CHUNK):
+            refresh_price_stats(db, pairs[start:start + PAIR_CHUNK])
+            db.flush()
+        db.commit()
+
+    logger.info(f"✅ Rebuilt price stats for {len(pairs)} commodity/market pairs")
+
+
+if __name__ == "__main__":
+    # python -m app.services.price_service rebuild
+    if sys.argv[1:] == ["rebuild"]:
+        rebuild_price_stats()
+    else:
+        print("usage: python -m app.services.price_service rebuild")
@@ -0,0 +1,174 @@
+import csv
+import json
+import logging
+from datetime import datetime
+
+from pydantic import ValidationError
+
+from app.database.db import SessionLocal
+from app.database.models import Purchase
+from app.schemas.purchase import PurchaseCreate
+from app.services.inventory_service import record_inventory
+from app.services.name_resolver import resolver
+from app.services.vendor_stats import apply_purchase_deltas, purchase_deltas
+
+logger = logging.getLogger(__name__)
+
+# Lines parsed, validated and inserted together
+UPLOAD_CHUNK = 1000
+
+# Row errors kept for the report; later ones are only counted
+MAX_REPORTED_ERRORS = 500
+
+UPLOAD_FORMATS = ("ndjson", "csv")
+
+# Longest line accepted; longer ones are skipped and reported as row errors
+MAX_LINE_BYTES = 64 * 1024
+
+
+def _decode(line: bytes):
+    return line.decode("utf-8-sig").rstrip("\r") if len(line) <= MAX_LINE_BYTES else None
+
+
+async def iter_lines(chunks):
+    """
+    Split a stream of byte chunks into decoded lines, one buffer at a time.
+    A line longer than MAX_LINE_BYTES comes out as None and is never buffered whole.
+    """
+    buffer = b""
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # Rest of an overlong line, already reported
+                skipping = False
+                continue
+            yield _decode(line)
+        if len(buffer) > MAX_LINE_BYTES:
+            if not skipping:
+                yield None
+            skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield _decode(buffer)
+
+
+def _format_errors(exc: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in exc.errors()]
+
+
+class PurchaseUpload:
+    """
+    One upload, fed chunk by chunk: valid rows are inserted with executemany,
+    inventory and vendor snapshot deltas are summed per vendor/product and
+    applied once in finish(), all in a single transaction. The shared
+    snapshot rows are thus only locked at the end, not while the client
+    keeps sending. Memory stays bounded by the chunk size, the distinct
+    items and the capped error list.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.header = None
+        self.created_at = datetime.utcnow()
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.inventory = {}
+        self.snapshot = None
+        self.names = {}
+        self.db = SessionLocal()
+
+    def _error(self, line_no: int, errors: list[str]):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "errors": errors})
+
+    def _parse(self, lines):
+        """(line number, raw dict) for each non-empty line; parse errors are recorded."""
+        if self.fmt == "csv":
+            for line_no, line in lines:
+                if line is None:
+                    self._error(line_no, [f"line longer than {MAX_LINE_BYTES} bytes"])
+                    continue
+                if self.header is None:
+                    self.header = [name.strip() for name in next(csv.reader([line]), [])]
+                    continue
+                if not line.strip():
+                    continue
+                values = next(csv.reader([line]))
+                if len(values) != len(self.header):
+                    self._error(line_no, [f"expected {len(self.header)} columns, got {len(values)}"])
+                    continue
+                # Empty CSV cells mean "not given", e.g. no seller_name
+                yield line_no, {k: v for k, v in zip(self.header, values) if v != ""}
+        else:
+            for line_no, line in lines:
+                if line is None:
+                    self._error(line_no, [f"line longer than {MAX_LINE_BYTES} bytes"])
+                    continue
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    self._error(line_no, [f"invalid JSON: {e}"])
+                    continue
+                if not isinstance(row, dict):
+                    self._error(line_no, ["expected a JSON object"])
+                    continue
+                yield line_no, row
+
+    def _canonical(self, product_name: str) -> str:
+        if product_name not in self.names:
+            self.names[product_name] = resolver.canonical_name("commodity", product_name, exact=True)
+        return self.names[product_name]
+
+    def add_chunk(self, lines: list[tuple[int, str]]):
+        rows = []
+        for line_no, raw in self._parse(lines):
+            try:
+                item = PurchaseCreate.model_validate(raw)
+            except ValidationError as e:
+                self._error(line_no, _format_errors(e))
+                continue
+
+            row = item.dict()
+            row["product_name"] = self._canonical(item.product_name)
+            row["created_at"] = self.created_at
+            rows.append(row)
+
+            key = (row["vendor_id"], row["product_name"])
+            self.inventory[key] = self.inventory.get(key, 0.0) + row["quantity"]
+
+        if rows:
+            # executemany: batched multi-row INSERTs, no ORM objects or refreshes
+            self.db.execute(Purchase.__table__.insert(), rows)
+            self.snapshot = purchase_deltas(rows, self.created_at.date(), self.snapshot)
+            self.inserted += len(rows)
+
+    def finish(self) -> dict:
+        try:
+            record_inventory(self.db, [
+                {"vendor_id": vendor_id, "product_name": product_name, "quantity": quantity}
+                for (vendor_id, product_name), quantity in self.inventory.items()
+            ])
+            if self.snapshot is not None:
+                apply_purchase_deltas(self.db, self.snapshot)
+            self.db.commit()
+        finally:
+            self.db.close()
+
+        logger.info(f"📥 Purchase upload: {self.inserted} inserted, {self.failed} rejected")
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+    def abort(self):
+        self.db.rollback()
+        self.db.close()
@@ -0,0 +1,174 @@
+import logging
+import sys
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, false, or_, select, tuple_
+
+from app.database.db import SessionLocal
+from app.database.models import MarketPrice, PriceRollup
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ("day", "week", "month")
+# Pairs per raw-row query
+PAIR_CHUNK = 200
+
+
+def bucket_start(day: date, grain: str) -> date:
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _bucket_end(day: date, grain: str) -> date:
+    start = bucket_start(day, grain)
+    if grain == "day":
+        return start + timedelta(days=1)
+    if grain == "week":
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _rollup_rows(commodity_id: int, market_id: int, rows: list, keys=None) -> list[dict]:
+    """rows: (created_at, price) sorted by time. keys limits output to those (grain, bucket_start)."""
+    # NumPy is only loaded once prices are actually written
+    from app.services.downsampling import ohlc, series_arrays
+
+    times, prices = series_arrays(rows)
+
+    result = []
+    for grain in GRAINS:
+        for bucket in ohlc(times, prices, grain):
+            start = bucket.pop("bucket_start").date()
+            if keys is None or (grain, start) in keys:
+                result.append({
+                    "grain": grain, "commodity_id": commodity_id, "market_id": market_id,
+                    "bucket_start": start, **bucket
+                })
+    return result
+
+
+def _range_filter(ranges: dict):
+    """ranges: {(commodity_id, market_id): (start_date, end_date)}, end exclusive."""
+    return or_(false(), *(
+        and_(
+            MarketPrice.commodity_id == commodity_id,
+            MarketPrice.market_id == market_id,
+            MarketPrice.created_at >= datetime.combine(start, time.min),
+            MarketPrice.created_at < datetime.combine(end, time.min),
+        )
+        for (commodity_id, market_id), (start, end) in ranges.items()
+    ))
+
+
+def _raw_rows(db, condition) -> dict:
+    """{(commodity_id, market_id): [(created_at, price), ...]} for rows matching condition."""
+    stmt = (
+        select(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at, MarketPrice.price_per_unit)
+        .where(condition)
+        .order_by(MarketPrice.commodity_id, MarketPrice.market_id, MarketPrice.created_at)
+    )
+
+    rows = {}
+    for commodity_id, market_id, created_at, price in db.execute(stmt):
+        rows.setdefault((commodity_id, market_id), []).append((created_at, price))
+    return rows
+
+
+def refresh_rollups(db, points):
+    """
+    Recompute the rollup buckets containing the given (commodity_id, market_id,
+    created_at) points from market_prices. Caller commits.
+    """
+    keys = {}
+    for commodity_id, market_id, created_at in points:
+        day = created_at.date() if hasattr(created_at, "date") else created_at
+        pair_keys = keys.setdefault((commodity_id, market_id), set())
+        pair_keys.update((grain, bucket_start(day, grain)) for grain in GRAINS)
+
+    pairs = sorted(keys)
+    for start in range(0, len(pairs), PAIR_CHUNK):
+        chunk = pairs[start:start + PAIR_CHUNK]
+
+        # Read whole buckets: from the earliest to the latest touched bucket per pair
+        ranges = {}
+        for pair in chunk:
+            starts = [b for _, b in keys[pair]]
+            ranges[pair] = (
+                min(starts),
+                max(_bucket_end(b, grain) for grain, b in keys[pair]),
+            )
+        raw = _raw_rows(db, _range_filter(ranges))
+
+        stale = [(grain, *pair, b) for pair in chunk for grain, b in keys[pair]]
+        db.execute(PriceRollup.__table__.delete().where(
+            tuple_(PriceRollup.grain, PriceRollup.commodity_id, PriceRollup.market_id, PriceRollup.bucket_start)
+            .in_(stale)
+        ))
+
+        fresh = []
+        for pair in chunk:
+            if pair in raw:
+                fresh.extend(_rollup_rows(*pair, raw[pair], keys[pair]))
+        if fresh:
+            db.execute(PriceRollup.__table__.insert(), fresh)
+
+
+def rollup_statement(grain: str, pair, start=None, end=None):
+    """Buckets of one (commodity_id, market_id) pair, oldest first; pair=None matches nothing."""
+    if pair is None:
+        return select(PriceRollup).where(false())
+
+    stmt = (
+        select(PriceRollup)
+        .where(
+            PriceRollup.grain == grain,
+            PriceRollup.commodity_id == pair[0],
+            PriceRollup.market_id == pair[1],
+        )
+        .order_by(PriceRollup.bucket_start)
+    )
+    # Buckets overlapping the range are returned whole
+    if start is not None:
+        stmt = stmt.where(PriceRollup.bucket_start >= bucket_start(start.date(), grain))
+    if end is not None:
+        stmt = stmt.where(PriceRollup.bucket_start <= end.date())
+    return stmt
+
+
+def rebuild_rollups():
+    """Recompute every rollup bucket from market_prices."""
+    with SessionLocal() as db:
+        pairs = [
+            tuple(p) for p in
+            db.query(MarketPrice.commodity_id, MarketPrice.market_id)
+            .filter(MarketPrice.commodity_id.isnot(None), MarketPrice.market_id.isnot(None))
+            .distinct()
+            .all()
+        ]
+
+        db.query(PriceRollup).delete(synchronize_session=False)
+        buckets = 0
+        for start in range(0, len(pairs), PAIR_CHUNK):
+            chunk = pairs[start:start + PAIR_CHUNK]
+            raw = _raw_rows(db, tuple_(MarketPrice.commodity_id, MarketPrice.market_id).in_(chunk))
+
+            fresh = []
+            for pair, rows in raw.items():
+                fresh.extend(_rollup_rows(*pair, rows))
+            if fresh:
+                db.execute(PriceRollup.__table__.insert(), fresh)
+            buckets += len(fresh)
+        db.commit()
+
+    logger.info(f"✅ Rebuilt {buckets} rollup buckets for {len(pairs)} commodity/market pairs")
+
+
+if __name__ == "__main__":
+    # python -m app.services.rollups rebuild
+    if sys.argv[1:] == ["rebuild"]:
+        rebuild_rollups()
+    else:
+        print("usage: python -m app.services.rollups rebuild")
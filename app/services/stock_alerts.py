@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.cache import PROCESS_ID, cache
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before a slow client starts missing them
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Published on the shared tier so streams served by every process see each event
+STOCK_ALERTS_CHANNEL = "stock-alerts"
+# Queued to tell streams to re-read their alerts, since events may have been missed
+RESYNC = {"event": "resync"}
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class StockAlertBroker:
+    """
+    In-process fan-out of low-stock events to the vendor's open SSE streams.
+    publish() is thread-safe (writes happen in the threadpool), delivery runs
+    on each subscriber's event loop. Events from other processes arrive
+    through start_stock_alert_listener(), or by polling without Redis.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, vendor_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(vendor_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, vendor_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(vendor_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(vendor_id, None)
+
+    def publish(self, stock_event: dict):
+        with self._lock:
+            targets = list(self._subscribers.get(stock_event["vendor_id"], {}).items())
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_deliver, queue, stock_event)
+
+    def resync(self):
+        with self._lock:
+            targets = [target for queues in self._subscribers.values() for target in queues.items()]
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_deliver, queue, RESYNC)
+
+
+def _deliver(queue: asyncio.Queue, stock_event: dict):
+    try:
+        queue.put_nowait(stock_event)
+    except asyncio.QueueFull:
+        logger.warning(f"Dropping stock alert for a slow subscriber: {stock_event.get('product_name')}")
+
+
+broker = StockAlertBroker()
+
+
+def publish_after_commit(db, stock_events: list[dict]):
+    """Queue events on the session; they go out only if its transaction commits."""
+    db.info.setdefault("stock_events", []).extend(stock_events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    stock_events = session.info.pop("stock_events", [])
+    for stock_event in stock_events:
+        broker.publish(stock_event)
+    if stock_events and cache.shared is not None:
+        cache.shared.publish(STOCK_ALERTS_CHANNEL, {"source": PROCESS_ID, "events": stock_events})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("stock_events", None)
+
+
+def _remote_stock_events(message: dict):
+    if message.get("source") != PROCESS_ID:
+        for stock_event in message["events"]:
+            broker.publish(stock_event)
+
+
+def polls_for_events() -> bool:
+    """True when other processes' events can't be pushed here and streams must poll for them."""
+    return cache.shared is None
+
+
+def start_stock_alert_listener():
+    """Deliver stock events committed by other processes to this process's streams (API startup)."""
+    global _listener
+
+    if polls_for_events():
+        return
+
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=cache.shared.listen,
+                # Events sent while resubscribing are lost, so open streams re-read their alerts
+                args=(STOCK_ALERTS_CHANNEL, _remote_stock_events, broker.resync),
+                name="stock-alerts",
+                daemon=True,
+            )
+            _listener.start()
@@ -0,0 +1,151 @@
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.database.bulk import upsert_increment
+from app.database.db import SessionLocal
+from app.database.models import (
+    MarketPrice, Purchase, VendorDailyPurchases, VendorProductStats, VendorStats
+)
+
+logger = logging.getLogger(__name__)
+
+
+def purchase_deltas(purchases, day=None, deltas=None) -> dict:
+    """
+    Sum purchases (objects or dicts with vendor_id, product_name, quantity,
+    price_per_unit) into the vendor snapshot increments, adding onto `deltas`
+    when given. Size grows with the distinct vendors and products only.
+    """
+    day = day or datetime.utcnow().date()
+    deltas = deltas if deltas is not None else {"vendors": {}, "products": {}, "days": {}}
+    vendors, products, days = deltas["vendors"], deltas["products"], deltas["days"]
+
+    for p in purchases:
+        get = p.get if isinstance(p, dict) else lambda name: getattr(p, name)
+        vendor_id, product_name = get("vendor_id"), get("product_name")
+        quantity, price = get("quantity"), get("price_per_unit")
+
+        totals = vendors.setdefault(vendor_id, {
+            "vendor_id": vendor_id, "total_purchases": 0, "total_spent": 0.0, "total_purchase_price": 0.0
+        })
+        totals["total_purchases"] += 1
+        totals["total_spent"] += quantity * price
+        totals["total_purchase_price"] += price
+
+        product = products.setdefault((vendor_id, product_name), {
+            "vendor_id": vendor_id, "product_name": product_name, "total_quantity": 0.0
+        })
+        product["total_quantity"] += quantity
+
+        daily = days.setdefault((vendor_id, day), {"vendor_id": vendor_id, "day": day, "purchase_count": 0})
+        daily["purchase_count"] += 1
+
+    return deltas
+
+
+def apply_purchase_deltas(db, deltas: dict):
+    """Add purchase_deltas() onto the snapshot tables in the caller's transaction."""
+    # Key order, so two transactions touching the same rows lock them in the same order
+    upsert_increment(
+        db, VendorStats.__table__, [deltas["vendors"][k] for k in sorted(deltas["vendors"])], ["vendor_id"],
+        ["total_purchases", "total_spent", "total_purchase_price"]
+    )
+    upsert_increment(
+        db, VendorProductStats.__table__, [deltas["products"][k] for k in sorted(deltas["products"])],
+        ["vendor_id", "product_name"], ["total_quantity"]
+    )
+    upsert_increment(
+        db, VendorDailyPurchases.__table__, [deltas["days"][k] for k in sorted(deltas["days"])],
+        ["vendor_id", "day"], ["purchase_count"]
+    )
+
+
+def record_purchases(db, purchases, day=None):
+    """
+    Fold purchases into the vendor snapshot tables. Runs in the caller's
+    transaction, so the snapshot commits or rolls back with the purchases.
+    """
+    apply_purchase_deltas(db, purchase_deltas(purchases, day))
+
+
+def dashboard_snapshot_statement(vendor_id: int):
+    """Everything the vendor dashboard needs, in one query against the snapshot tables."""
+    top_product = (
+        select(VendorProductStats.product_name)
+        .where(VendorProductStats.vendor_id == vendor_id)
+        .order_by(VendorProductStats.total_quantity.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    # Last 7 calendar days, today included
+    since = datetime.utcnow().date() - timedelta(days=6)
+    recent_purchases = (
+        select(func.coalesce(func.sum(VendorDailyPurchases.purchase_count), 0))
+        .where(VendorDailyPurchases.vendor_id == vendor_id, VendorDailyPurchases.day >= since)
+        .scalar_subquery()
+    )
+
+    # Reads the newest 50 entries of ix_market_prices_created_at, not the whole table
+    latest_market = (
+        select(MarketPrice.price_per_unit)
+        .order_by(MarketPrice.created_at.desc())
+        .limit(50)
+        .subquery()
+    )
+    avg_market_price = select(func.avg(latest_market.c.price_per_unit)).scalar_subquery()
+
+    return (
+        select(
+            VendorStats.total_purchases,
+            VendorStats.total_spent,
+            VendorStats.total_purchase_price,
+            top_product.label("most_purchased_product"),
+            recent_purchases.label("recent_purchases_7_days"),
+            avg_market_price.label("avg_market_price"),
+        )
+        .where(VendorStats.vendor_id == vendor_id)
+    )
+
+
+def rebuild_vendor_stats():
+    """Recompute the vendor snapshot tables from the purchases table."""
+    with SessionLocal() as db:
+        for model in (VendorStats, VendorProductStats, VendorDailyPurchases):
+            db.query(model).delete(synchronize_session=False)
+
+        db.execute(VendorStats.__table__.insert().from_select(
+            ["vendor_id", "total_purchases", "total_spent", "total_purchase_price"],
+            select(
+                Purchase.vendor_id,
+                func.count(Purchase.id),
+                func.sum(Purchase.quantity * Purchase.price_per_unit),
+                func.sum(Purchase.price_per_unit),
+            ).group_by(Purchase.vendor_id)
+        ))
+        db.execute(VendorProductStats.__table__.insert().from_select(
+            ["vendor_id", "product_name", "total_quantity"],
+            select(Purchase.vendor_id, Purchase.product_name, func.sum(Purchase.quantity))
+            .group_by(Purchase.vendor_id, Purchase.product_name)
+        ))
+
+        day = func.date(Purchase.created_at)
+        db.execute(VendorDailyPurchases.__table__.insert().from_select(
+            ["vendor_id", "day", "purchase_count"],
+            select(Purchase.vendor_id, day, func.count(Purchase.id))
+            .group_by(Purchase.vendor_id, day)
+        ))
+        db.commit()
+
+    logger.info("✅ Rebuilt vendor stats")
+
+
+if __name__ == "__main__":
+    # python -m app.services.vendor_stats rebuild
+    if sys.argv[1:] == ["rebuild"]:
+        rebuild_vendor_stats()
+    else:
+        print("usage: python -m app.services.vendor_stats rebuild")
@@ -0,0 +1,116 @@
+"""
+Background worker: runs the scheduled imports and training outside the API.
+
+    python -m app.worker              # scheduler loop (run one or more for failover)
+    python -m app.worker run <job>    # run a job once, now
+
+Schedules live in the database (APScheduler SQLAlchemy job store). Every
+worker competes for the "scheduler" lease; only the holder runs the
+scheduler, the others wait and take over if it stops renewing. Each job run
+also takes its own lease and is recorded in job_runs. The scheduler also
+bumps the db heartbeat the API measures replica lag with.
+"""
+import logging
+import signal
+import sys
+import time
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from app.config import DB_HEARTBEAT_INTERVAL, WORKER_LOCK_TTL
+from app.database.db import engine
+from app.database.routing import write_heartbeat
+from app.services.jobs import WORKER_ID, LeaseLock, run_job
+
+logger = logging.getLogger(__name__)
+
+
+def import_prices_job():
+    from app.services.gov_data_import import import_gov_prices
+    return run_job("import_gov_prices", import_gov_prices, lambda totals: totals["inserted"], lock_ttl=3600)
+
+
+def training_job():
+    from app.ml.train_price_model import train_all
+    return run_job("nightly_training", train_all, lambda report: report["trained"], lock_ttl=6 * 3600)
+
+
+def forecast_job():
+    from app.ml.forecast import refresh_forecasts
+    return run_job("refresh_forecasts", refresh_forecasts, lambda written: written, lock_ttl=3600)
+
+
+def heartbeat_job():
+    # Too frequent for run_job's lease and job_runs row; one scheduler runs it anyway
+    write_heartbeat(engine)
+
+
+# job id -> (function, cron trigger arguments)
+JOBS = {
+    "import_gov_prices": (import_prices_job, {"minute": 1}),
+    "nightly_training": (training_job, {"hour": 3, "minute": 0}),
+    # Shortly after midnight UTC, so negotiations read a forecast for the current day
+    "refresh_forecasts": (forecast_job, {"hour": 0, "minute": 15}),
+}
+
+
+def build_scheduler() -> BackgroundScheduler:
+    scheduler = BackgroundScheduler(
+        jobstores={"default": SQLAlchemyJobStore(engine=engine, tablename="scheduled_jobs")},
+        job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 300},
+    )
+    for job_id, (fn, cron) in JOBS.items():
+        # Stored by import path, so any worker can load it from the job store
+        scheduler.add_job(f"app.worker:{fn.__name__}", "cron", id=job_id, replace_existing=True, **cron)
+    # The API's replica monitors measure lag against this row (app/database/routing.py)
+    scheduler.add_job(
+        "app.worker:heartbeat_job", "interval", id="db_heartbeat", replace_existing=True,
+        seconds=DB_HEARTBEAT_INTERVAL,
+    )
+    return scheduler
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def run_scheduler():
+    leader = LeaseLock("scheduler", WORKER_LOCK_TTL)
+    scheduler = None
+    signal.signal(signal.SIGTERM, _stop)
+    logger.info(f"👷 Worker {WORKER_ID} started")
+
+    try:
+        while True:
+            try:
+                is_leader = leader.acquire()
+            except Exception:
+                logger.exception("Could not reach the lock table")
+                is_leader = False
+
+            if is_leader and scheduler is None:
+                logger.info("👑 Became scheduler leader")
+                scheduler = build_scheduler()
+                scheduler.start()
+            elif not is_leader and scheduler is not None:
+                logger.warning("Lost scheduler lease, stopping scheduler")
+                scheduler.shutdown(wait=False)
+                scheduler = None
+
+            # Renew well before the lease runs out
+            time.sleep(WORKER_LOCK_TTL / 3)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown(wait=False)
+            leader.release()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] == ["run"] and sys.argv[2:3] and sys.argv[2] in JOBS:
+        JOBS[sys.argv[2]][0]()
+    elif not sys.argv[1:]:
+        run_scheduler()
+    else:
+        print(f"usage: python -m app.worker [run {'|'.join(JOBS)}]")
@@ -0,0 +1,101 @@
+"""
+Load benchmark comparing the sync and async database stacks.
+
+Runs the hot read endpoints in-process (ASGI transport, no network) under
+increasing concurrency, once per stack in a fresh interpreter so USE_ASYNC_DB
+is picked up at import time. Point DATABASE_URL at a populated database:
+
+    python scripts/bench_async_db.py --product potato --location azadpur
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+async def run_stack(product: str, location: str, vendor_id: int, concurrency: int, requests: int) -> dict:
+    import httpx
+    from fastapi import FastAPI
+    from app.routes import prices, trend, vendors
+
+    app = FastAPI()
+    app.include_router(prices.router, prefix="/prices")
+    app.include_router(trend.router, prefix="/trends")
+    app.include_router(vendors.router, prefix="/vendors")
+
+    paths = [
+        f"/prices/estimate/{product}?location={location}",
+        f"/prices/alerts/{product}?location={location}",
+        f"/prices/trend/{product}?location={location}&limit=50",
+        f"/trends/price-trend?product_name={product}&location={location}",
+        f"/vendors/dashboard/{vendor_id}",
+    ]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        # Warm up caches, pools and the name resolver
+        await asyncio.gather(*(one(i) for i in range(len(paths) * 2)))
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--product", required=True)
+    parser.add_argument("--location", required=True)
+    parser.add_argument("--vendor-id", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", default="10,40,100,200")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    if args.worker:
+        results = [
+            asyncio.run(run_stack(args.product, args.location, args.vendor_id, level, args.requests))
+            for level in levels
+        ]
+        print(json.dumps(results))
+        return
+
+    for stack in ("sync", "async"):
+        env = {**os.environ, "USE_ASYNC_DB": "true" if stack == "async" else "false"}
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", *sys.argv[1:]],
+            env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        for row in json.loads(output.strip().splitlines()[-1]):
+            print(f"{stack:>5}  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(ROOT))
+    main()
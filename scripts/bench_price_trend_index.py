@@ -0,0 +1,104 @@
+"""
+Regression benchmark for /trends/price-trend.
+
+Grows a scratch SQLite database step by step and, at each size, checks that
+the raw and interval queries are still answered from the covering index
+(EXPLAIN QUERY PLAN says "USING COVERING INDEX") and times them. Exits
+non-zero as soon as a plan falls back to the table, so it can run in CI:
+
+    python scripts/bench_price_trend_index.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+COMMODITIES = 50
+MARKETS = 40
+INDEX = "ix_market_prices_pair_time_price"
+
+
+def fill(db, MarketPrice, start: int, stop: int):
+    """Rows start..stop-1, spread over every pair with one price per pair per day."""
+    pairs = COMMODITIES * MARKETS
+    base = datetime(2020, 1, 1)
+    rows = []
+    for n in range(start, stop):
+        pair, day = n % pairs, n // pairs
+        commodity_id, market_id = pair // MARKETS + 1, pair % MARKETS + 1
+        rows.append({
+            "product_name": f"commodity {commodity_id}",
+            "location": f"market {market_id}",
+            "commodity_id": commodity_id,
+            "market_id": market_id,
+            "created_at": base + timedelta(days=day),
+            "price_per_unit": random.uniform(800, 4000),
+        })
+        if len(rows) == 10000:
+            db.execute(MarketPrice.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.execute(MarketPrice.__table__.insert(), rows)
+    db.commit()
+
+
+def plan(db, stmt) -> str:
+    compiled = stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return " | ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    sys.path.insert(0, str(ROOT))
+
+    from app.database.db import SessionLocal, engine
+    from app.database.models import Base, MarketPrice
+    from app.routes.trend import INTERVALS, price_trend_statement
+
+    Base.metadata.create_all(engine)
+    # Queries are dated relative to today; make "days" reach back to the seeded data
+    days = (datetime.today() - datetime(2020, 1, 1)).days
+
+    failed = False
+    loaded = 0
+    with SessionLocal() as db:
+        for size in (int(s) for s in args.sizes.split(",")):
+            fill(db, MarketPrice, loaded, size)
+            loaded = size
+            db.connection().exec_driver_sql("ANALYZE")
+
+            for interval in (None, *INTERVALS):
+                stmt = price_trend_statement((7, 11), days, interval)
+                query_plan = plan(db, stmt)
+                covered = f"USING COVERING INDEX {INDEX}" in query_plan
+
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    points = len(db.execute(stmt).all())
+                elapsed_ms = (time.perf_counter() - started) / args.repeat * 1000
+
+                print(
+                    f"rows={size:>9}  interval={interval or 'raw':>5}  points={points:>5}  "
+                    f"{elapsed_ms:7.2f} ms  {'index-only' if covered else 'TABLE ACCESS'}"
+                )
+                if not covered:
+                    print(f"   plan: {query_plan}")
+                    failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Startup-time benchmark: how long `import app.main` takes, and where it goes.
+
+Runs the import in fresh interpreters with `-X importtime`, reports the
+median total and the slowest modules, and fails when the import pulls in a
+heavy module that should load lazily, or exceeds the time budget:
+
+    python scripts/bench_startup.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Must only load on first ML / analytics use, never at API import
+LAZY_MODULES = ("sklearn", "numpy", "joblib", "pyarrow", "scipy", "apscheduler")
+
+
+def import_profile(target: str) -> dict:
+    """{module: (self_us, cumulative_us)} for one cold import of target."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True,
+        # Any URL works: importing must not connect
+        env={**os.environ, "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite://")},
+    )
+    if result.returncode:
+        sys.exit(result.stderr)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.target) for _ in range(args.runs)]
+    totals = [p[args.target][1] / 1000 for p in profiles]
+    median_ms = statistics.median(totals)
+
+    print(f"import {args.target}: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f})")
+
+    # Slowest app modules by cumulative time, from the median run
+    profile = sorted(profiles, key=lambda p: p[args.target][1])[len(profiles) // 2]
+    slowest = sorted(profile.items(), key=lambda item: item[1][1], reverse=True)
+    print(f"\n{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    failed = False
+    eager = sorted({name.split(".")[0] for name in profile} & set(LAZY_MODULES))
+    if eager:
+        print(f"\n❌ Imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"\n❌ Median import time {median_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Concurrency stress test for inventory updates.
+
+Many threads post purchases (POST /purchases/ and /purchases/batch) for the
+same few vendor/product pairs at once, then every pair must have exactly one
+inventory row holding the sum of its purchased quantities:
+
+    python scripts/stress_inventory.py --threads 16 --rounds 50
+
+Uses DATABASE_URL when set (point it at a scratch MySQL database), otherwise a
+fresh SQLite file. Vendor ids are random and high, so existing rows are not touched.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/stress.db?timeout=60"
+
+PRODUCTS = ["stress-onion", "stress-potato", "stress-tomato"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=50, help="requests per thread")
+    parser.add_argument("--vendors", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func
+    from app.database.db import SessionLocal
+    from app.database.migrate import migrate
+    from app.database.models import Inventory
+    from app.main import create_app
+
+    migrate()
+    client = TestClient(create_app())
+    base = random.randint(10_000_000, 20_000_000)
+    pairs = [(base + v, product) for v in range(args.vendors) for product in PRODUCTS]
+
+    def purchase(vendor_id, product_name, quantity):
+        return {"vendor_id": vendor_id, "product_name": product_name,
+                "quantity": quantity, "price_per_unit": 20.0}
+
+    def worker(seed):
+        rng = random.Random(seed)
+        expected = {}
+        for i in range(args.rounds):
+            # Alternate single purchases and batches over the same hot rows
+            items = [purchase(*rng.choice(pairs), rng.randint(1, 5))
+                     for _ in range(1 if i % 2 else args.batch_size)]
+            path = "/purchases/" if len(items) == 1 else "/purchases/batch"
+            response = client.post(path, json=items[0] if len(items) == 1 else items)
+            response.raise_for_status()
+            for item in items:
+                key = (item["vendor_id"], item["product_name"])
+                expected[key] = expected.get(key, 0) + item["quantity"]
+        return expected
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    expected = {}
+    for result in results:
+        for key, quantity in result.items():
+            expected[key] = expected.get(key, 0) + quantity
+
+    with SessionLocal() as db:
+        rows = (
+            db.query(Inventory.vendor_id, Inventory.product_name,
+                     func.count(Inventory.id), func.sum(Inventory.quantity_available))
+            .filter(Inventory.vendor_id.in_({vendor_id for vendor_id, _ in pairs}))
+            .group_by(Inventory.vendor_id, Inventory.product_name)
+            .all()
+        )
+    stored = {(vendor_id, product): (count, total) for vendor_id, product, count, total in rows}
+
+    requests = args.threads * args.rounds
+    print(f"{requests} requests from {args.threads} threads in {elapsed:.1f}s "
+          f"({requests / elapsed:.0f} req/s), {sum(expected.values())} units over {len(pairs)} items")
+
+    failed = False
+    for key in sorted(expected):
+        count, total = stored.get(key, (0, 0))
+        if count != 1 or total != expected[key]:
+            print(f"❌ {key}: {count} rows, quantity {total}, expected 1 row with {expected[key]}")
+            failed = True
+
+    if not failed:
+        print("✅ No lost updates, no duplicate inventory rows")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()